@@ -3,6 +3,7 @@ from get_url_from_safari import get_url_from_safari
 from settings import book_db_path
 
 from book_db import BookDatabase
+from goodreads_cache import GoodreadsCache
 
 
 def add_book_from_safari():
@@ -11,7 +12,7 @@ def add_book_from_safari():
     url = get_url_from_safari()
     id = get_id_from_url(url)
 
-    book_db = BookDatabase(book_db_path)
+    book_db = BookDatabase(book_db_path, metadata_cache=GoodreadsCache())
 
     book_db.add_entry_to_book_db(id)
     book_db.write_csv()
@@ -1,10 +1,19 @@
-from book_prices_db import BookPricesDatabase
+import settings
+
 from book_deals_db import BookDealsDatabase
+from marketplace import marketplaces
+from marketplace_crawl import MarketplaceCrawl
 
 from settings import real_deal_paths
 
-book_prices_db = BookPricesDatabase(real_deal_paths)
-book_prices_db.run()
+# marketplaces crawled at the same time, each with its own price table and deals report
+marketplace_names = getattr(settings, 'marketplace_names', ('de',))
+
+# the pipeline crawl starts worker processes, which import this module again
+if __name__ == '__main__':
+    marketplace_crawl = MarketplaceCrawl(real_deal_paths, marketplace_names)
+    marketplace_crawl.run()
 
-book_deals_db = BookDealsDatabase(real_deal_paths)
-book_deals_db.run()
+    for name in marketplace_names:
+        book_deals_db = BookDealsDatabase(real_deal_paths, marketplaces[name])
+        book_deals_db.run()
@@ -2,28 +2,77 @@
 
 import bs4
 import re
-import requests
 import time
 
 from datetime import datetime
 
+from http_client import get_default_http_client
+from marketplace import default_marketplace, marketplaces
+from product_page_extractor import ProductPageExtractor
 from select_user_agent import select_user_agent
 
 from tools import get_price_from_bs4_object
 from tools import get_id_from_url
 
 
+# one extraction engine per marketplace, the texts and the price format differ
+product_page_extractors = {name: ProductPageExtractor(marketplace) for name, marketplace in marketplaces.items()}
+
+
+def get_product_page_extractor(marketplace):
+    """ Get the extraction engine for the pages of a marketplace """
+
+    if marketplace.name not in product_page_extractors:
+        product_page_extractors[marketplace.name] = ProductPageExtractor(marketplace)
+
+    return product_page_extractors[marketplace.name]
+
+
+# containers of the regions we extract: title, subtitle, author, formats, buybox and merchant info
+product_page_regions = bs4.SoupStrainer(id=[
+    'productTitle',
+    'productSubtitle',
+    'bylineInfo',
+    'tmmSwatches',
+    'showMoreFormatsPrompt',
+    'buybox',
+    'merchant-info',
+    'kindle-price',
+    ])
+
+
 class AmazonProductPage():
     """ A class representing an amazon product page """
 
 
-    def __init__(self, id):
+    def __init__(self, id, http_client=None, engine='lxml', html=None, partial=False, page_cache=None, fields=None, kindle=False, marketplace=None):
         
         self.id = id
+
+        # pooled keep-alive session, shared with the other pages of a run
+        self.http_client = http_client or get_default_http_client()
+
+        # 'lxml': single pass extraction engine, 'bs4': one find() per field
+        self.engine = engine
+
+        # build the bs4 tree only for the regions we extract
+        self.partial = partial
+
+        # html of the product page, requested if not given (e.g. saved pages)
+        self.html = html
+
+        # raw pages on disk, re-used instead of requested again for the same date
+        self.page_cache = page_cache
+
+        # page of a Kindle edition: the price has its own element, there is no seller and no shipping
+        self.kindle = kindle
+
+        # storefront of the page: domain, texts and price format
+        self.marketplace = marketplace or default_marketplace
         
-        self.url = f'https://www.amazon.de/dp/{id}'
+        self.url = self.marketplace.get_product_url(id)
         
-        self.amazon_base_url = f'https://www.amazon.de/dp/'
+        self.amazon_base_url = f'https://{self.marketplace.domain}/dp/'
                 
         self.country_code = None
         self.product_id = None
@@ -42,17 +91,55 @@ class AmazonProductPage():
         # object from BeautifulSoup (soup)
         self.bs4_object_product_page = None
 
+        # seconds spent parsing and extracting, None if the fields were extracted elsewhere
+        self.parse_time = None
+
+        # fields extracted in a worker process of the crawl pipeline, nothing is fetched or parsed here
+        if fields is not None:
+            self.apply_fields(fields)
+            return
+
         # initialize product page
-        self.bs4_object_product_page = self.build_bs4_object(self.url)
-                
-        self.get_product_price()
-        self.get_product_seller_infos()
-        self.check_shipping_infos()
-        self.get_kindle_edition()
-        self.get_kindle_price()
-        self.get_author()
-        self.get_title()
-        self.check_edition()
+        if self.html is None and self.page_cache:
+            self.html = self.page_cache.get(self.id, self.date)
+
+        # requested now, not read from the cache
+        fetched = False
+
+        if self.html is None:
+            request_response = self.request_product_page(self.url)
+            self.html = request_response.text
+            fetched = request_response.status_code == 200
+
+        start_time = time.perf_counter()
+
+        if self.engine == 'bs4' and self.kindle:
+            self.bs4_object_product_page = self.build_bs4_object(self.html)
+
+            self.get_kindle_page_price()
+            self.get_author()
+            self.get_title()
+
+        elif self.engine == 'bs4':
+            self.bs4_object_product_page = self.build_bs4_object(self.html)
+
+            self.get_product_price()
+            self.get_product_seller_infos()
+            self.check_shipping_infos()
+            self.get_kindle_edition()
+            self.get_kindle_price()
+            self.get_author()
+            self.get_title()
+            self.check_edition()
+
+        else:
+            self.extract_product_page()
+
+        self.parse_time = time.perf_counter() - start_time
+
+        # robot checks and captchas are answered with 200 too, they are not served from the cache
+        if fetched and self.check_product_page():
+            self.log_product_page()
         
     
     def request_product_page(self, url):
@@ -61,26 +148,111 @@ class AmazonProductPage():
         user_agent = select_user_agent()
         headers = {'User-Agent': user_agent}
         
-        r = requests.get(url, headers = headers)
+        r = self.http_client.get(url, headers = headers)
 
         return r
 
     
-    def build_bs4_object(self, url):
+    def build_bs4_object(self, html):
         """ Build object for BeautifulSoup """
 
-        request_response = self.request_product_page(url)
-        soup = bs4.BeautifulSoup(request_response.text, 'lxml')
+        if self.partial:
+            soup = bs4.BeautifulSoup(html, 'lxml', parse_only=product_page_regions)
+        else:
+            soup = bs4.BeautifulSoup(html, 'lxml')
 
         return soup
 
 
-    def log_product_page(self, page):
+    def extract_product_page(self):
+        """ Extract all fields in a single pass over the page """
+
+        fields = get_product_page_extractor(self.marketplace).extract(self.html)
+        self.apply_fields(fields)
+
+
+    def apply_fields(self, fields):
+        """ Assign extracted fields and run the same checks as the bs4 methods """
+
+        if self.kindle:
+            self.apply_kindle_fields(fields)
+            return None
+
+        self.product_price = fields['product_price']
+
+        if self.product_price is None:
+            print('not text found for price')
+
+        self.product_seller_infos = fields['product_seller_infos']
+
+        if self.product_seller_infos is None:
+            print('no text found for merchant info')
+            self.product_price = None
+
+        self.check_shipping_infos()
+
+        self.kindle_edition = fields['kindle_edition']
+
+        if self.kindle_edition is None:
+            print('kindle edition not found')
+
+        self.kindle_price = fields['kindle_price']
+
+        if self.kindle_price is None:
+            print('kindle price not found')
+
+        self.author = fields['author']
+
+        if self.author is None:
+            print('not text found for author')
+
+        if fields['title'] is None:
+            print('not text found for title')
+        else:
+            self.title = fields['title'].capitalize()
+
+        if fields['subtitle'] is None:
+            print('not text found for more title information')
+        else:
+            self.check_subtitle(fields['subtitle'])
+
+
+    def apply_kindle_fields(self, fields):
+        """ Assign the extracted fields of a Kindle page """
+
+        self.product_price = fields['kindle_page_price']
+
+        if self.product_price is None:
+            print('not text found for kindle price')
+
+        self.author = fields['author']
+
+        if self.author is None:
+            print('not text found for author')
+
+        if fields['title'] is None:
+            print('not text found for title')
+        else:
+            self.title = fields['title'].capitalize()
+
+
+    def check_product_page(self):
+        """ Check if the page is a product page, e.g. not a robot check """
+
+        return self.title is not None or self.product_price is not None
+
+
+    def log_product_page(self):
         """ Log product page """
 
-        # create log from amazon html code as a text file 
-        with open(f'log/amz_{id}_{self.date}.txt', 'w', encoding='utf-8') as f:
-            f.write(page.prettify())
+        if not self.page_cache:
+            return None
+
+        # raw html in the compressed page cache, read back when the page is extracted again
+        try:
+            self.page_cache.put(self.id, self.date, self.html)
+        except Exception as e:
+            print(f'caching the page failed for id {self.id}: {e}')
 
     
     def get_product_price(self):
@@ -102,9 +274,30 @@ class AmazonProductPage():
             print('not text found for price')
             return None
 
-        self.product_price = get_price_from_bs4_object(r)
+        self.product_price = self.get_price_from_bs4_object(r)
         
 
+    def get_kindle_page_price(self):
+        """ Get price from the product page of a Kindle edition """
+
+        r = self.bs4_object_product_page.find('span', id='kindle-price')
+
+        if not r:
+            print('not text found for kindle price')
+            return None
+
+        self.product_price = self.get_price_from_bs4_object(r)
+
+
+    def get_price_from_bs4_object(self, r):
+        """ Get a price in the format of the marketplace """
+
+        if self.marketplace is default_marketplace:
+            return get_price_from_bs4_object(r)
+
+        return self.marketplace.get_price_from_text(r.get_text(strip=True))
+
+
     def get_product_seller_infos(self):
         """ Get merchant info from product page """
     
@@ -125,9 +318,7 @@ class AmazonProductPage():
             print(f'check seller for id {self.url}')
             return None
 
-        text = 'Versand durch Amazon'
-
-        if text not in self.product_seller_infos:
+        if not self.marketplace.check_shipped_by_amazon(self.product_seller_infos):
             self.versand_durch_amazon = False
             self.product_price = None
 
@@ -168,6 +359,12 @@ class AmazonProductPage():
             return None
         
         subtitle  = r.get_text(strip=True)
+
+        self.check_subtitle(subtitle)
+
+
+    def check_subtitle(self, subtitle):
+        """ check if the subtitle describes a special edition """
         
         match = re.compile('Rauer Buchschnitt').search(subtitle)
         
@@ -197,7 +394,7 @@ class AmazonProductPage():
             
             """
             
-            kindle = other_editions.find_next('span', class_='a-size-small a-color-base', string='Kindle')
+            kindle = other_editions.find_next('span', class_='a-size-small a-color-base', string=self.marketplace.kindle_format)
             kindle_link = kindle.parent['href']
             
             kindle_edition = get_id_from_url(kindle_link)
@@ -229,11 +426,11 @@ class AmazonProductPage():
             
             """
                         
-            kindle = other_editions.find_next('span', class_='a-size-small a-color-base', string='Kindle')
+            kindle = other_editions.find_next('span', class_='a-size-small a-color-base', string=self.marketplace.kindle_format)
                         
             kindle_price_object = kindle.find_next('span', class_='a-size-small a-color-price')
 
-            kindle_price = get_price_from_bs4_object(kindle_price_object)
+            kindle_price = self.get_price_from_bs4_object(kindle_price_object)
                         
             self.kindle_price = kindle_price
 
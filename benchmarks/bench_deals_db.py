@@ -0,0 +1,66 @@
+""" Benchmark the deals report end to end: BookDealsDatabase on a synthetic price history and create_html_report """
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import book_deals_db
+
+from book_deals_db import BookDealsDatabase
+from synthetic_price_db import create_synthetic_databases, price_table_names
+
+
+def time_backend(backend, number_of_books, number_of_days):
+    """ Get the seconds to load the last date and to write the report for a storage backend """
+
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_infos = create_synthetic_databases(directory, number_of_books, number_of_days, backend)
+
+        start_time = time.perf_counter()
+        deals_db = BookDealsDatabase(db_infos)
+        results['load'] = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        deals_db.create_html_report()
+        results['report'] = time.perf_counter() - start_time
+
+    return results
+
+
+def run_benchmark(number_of_books=10000, number_of_days=3 * 365, backends=('csv', 'sqlite', 'parquet')):
+    """ Get the seconds of each step per backend """
+
+    # the report is not opened in a browser
+    book_deals_db.open_url_in_safari = lambda url: None
+
+    results = {}
+
+    for backend in backends:
+        for step, seconds in time_backend(backend, number_of_books, number_of_days).items():
+            results[f'deals_db {backend} {step}'] = seconds
+
+    return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=3 * 365)
+    parser.add_argument('--backends', nargs='+', default=list(price_table_names), choices=list(price_table_names))
+    args = parser.parse_args()
+
+    print(f'books: {args.books}, days: {args.days}, rows: {args.books * args.days}')
+
+    for name, seconds in run_benchmark(args.books, args.days, args.backends).items():
+        print(f'{name}: {seconds:.4f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+""" Benchmark the parse cost of BookGoodreads on goodreads xml responses
+
+The responses in benchmarks/goodreads are synthetic: the structure of a goodreads book_show response with
+generated filler text, not responses saved from the api. Real saved responses can be passed with --responses. """
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+from glob import glob
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from book_goodreads import BookGoodreads
+
+
+responses_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'goodreads')
+
+
+class SavedResponses():
+    """ A class representing an http client that answers goodreads requests from xml files on disk """
+
+    def __init__(self, path):
+
+        # isbn -> (goodreads id, book xml), the file name is the isbn
+        self.responses = {}
+
+        for file_path in sorted(glob(os.path.join(path, '*.xml'))):
+            isbn = os.path.splitext(os.path.basename(file_path))[0]
+
+            with open(file_path, encoding='utf-8') as f:
+                xml = f.read()
+
+            with open(os.path.join(path, f'{isbn}.id'), encoding='utf-8') as f:
+                goodreads_id = f.read().strip()
+
+            self.responses[isbn] = (goodreads_id, xml)
+
+
+    def get(self, url, params=None, headers=None):
+
+        if url.endswith('isbn_to_id'):
+            return SimpleNamespace(status_code=200, text=self.responses[params['isbn']][0])
+
+        isbn = url.rsplit('/', 1)[-1]
+
+        return SimpleNamespace(status_code=200, text=self.responses[isbn][1])
+
+
+def run_benchmark(path=responses_dir, repeat=20):
+    """ Get the average seconds per book """
+
+    http_client = SavedResponses(path)
+
+    if not http_client.responses:
+        print(f'no responses found in {path}')
+        return {}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start_time = time.perf_counter()
+
+        for _ in range(repeat):
+            for isbn in http_client.responses:
+                BookGoodreads(isbn, http_client)
+
+        runtime = time.perf_counter() - start_time
+
+    return {'goodreads per_book': runtime / (repeat * len(http_client.responses))}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--responses', default=responses_dir, help='directory with goodreads xml responses, synthetic by default')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    results = run_benchmark(args.responses, args.repeat)
+
+    for name, seconds in results.items():
+        print(f'{name}: {seconds * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+""" Benchmark BookPricesDatabase on a synthetic multi-year price history: load, aggregates and write_csv """
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from book_prices_db import BookPricesDatabase
+from synthetic_price_db import create_synthetic_databases, price_table_names
+
+
+def create_entries(book_prices_db, date):
+    """ Create a crawled row for every book of the catalog """
+
+    entries = []
+
+    for id in book_prices_db.book_db.unique_ids:
+        book_information = book_prices_db.book_db.get_book_information_from_book_db(id)
+
+        entries.append({
+            'date': date,
+            'id': id,
+            'title': book_information['title'],
+            'format': book_information['format'],
+            'target_price': book_information['target_price'],
+            'price': 1299,
+            'used_price': None,
+            'average_price': book_prices_db.calculate_average_over_time(id),
+            'average_price_last_week': book_prices_db.calculate_average_last_week(id),
+            'lowest_price': book_prices_db.calculate_lowest_price(id),
+            'kindle_price': 799,
+        })
+
+    return entries
+
+
+def time_backend(backend, number_of_books, number_of_days):
+    """ Get the seconds of each step for a storage backend """
+
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        start_time = time.perf_counter()
+        db_infos = create_synthetic_databases(directory, number_of_books, number_of_days, backend)
+        results['create'] = time.perf_counter() - start_time
+
+        # the database writes its cache and log files relative to the working directory
+        working_directory = os.getcwd()
+        os.chdir(directory)
+        os.makedirs('log', exist_ok=True)
+
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                # no statistics file: the statistics are built from the history
+                start_time = time.perf_counter()
+                book_prices_db = BookPricesDatabase(db_infos)
+                results['load_cold'] = time.perf_counter() - start_time
+
+                book_prices_db.price_statistics.save()
+
+                start_time = time.perf_counter()
+                book_prices_db = BookPricesDatabase(db_infos)
+                results['load'] = time.perf_counter() - start_time
+
+                ids = book_prices_db.book_db.unique_ids
+
+                start_time = time.perf_counter()
+
+                for id in ids:
+                    book_prices_db.calculate_average_over_time(id)
+                    book_prices_db.calculate_average_last_week(id)
+                    book_prices_db.calculate_lowest_price(id)
+
+                results['aggregates_per_id'] = (time.perf_counter() - start_time) / len(ids)
+
+                # one new crawl date for the whole catalog
+                for entry in create_entries(book_prices_db, '2099-01-01'):
+                    book_prices_db.add_row(entry)
+
+                start_time = time.perf_counter()
+                book_prices_db.write_csv()
+                results['write_csv'] = time.perf_counter() - start_time
+
+        finally:
+            os.chdir(working_directory)
+
+    return results
+
+
+def run_benchmark(number_of_books=10000, number_of_days=3 * 365, backends=('csv', 'sqlite', 'parquet')):
+    """ Get the seconds of each step per backend, keys like 'price_db csv load' """
+
+    results = {}
+
+    for backend in backends:
+        for step, seconds in time_backend(backend, number_of_books, number_of_days).items():
+            results[f'price_db {backend} {step}'] = seconds
+
+    return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=3 * 365)
+    parser.add_argument('--backends', nargs='+', default=list(price_table_names), choices=list(price_table_names))
+    args = parser.parse_args()
+
+    print(f'books: {args.books}, days: {args.days}, rows: {args.books * args.days}')
+
+    for name, seconds in run_benchmark(args.books, args.days, args.backends).items():
+        print(f'{name}: {seconds:.6f} s')
+
+
+if __name__ == '__main__':
+    main()
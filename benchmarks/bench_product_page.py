@@ -0,0 +1,89 @@
+""" Benchmark the per-page parse cost of AmazonProductPage on product pages
+
+benchmarks/pages holds a single synthetic page built like an amazon.de product page, not a page saved from
+amazon. It does not cover pages without a price, without a Kindle edition or of other formats; saved
+pages can be passed with --pages. """
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+from glob import glob
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from amazon_product_page import AmazonProductPage
+
+
+pages_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages')
+
+
+def load_pages(path):
+    """ Load product pages as (id, html), the file name is the id """
+
+    pages = []
+
+    for file_path in sorted(glob(os.path.join(path, '*.html'))):
+        id = os.path.splitext(os.path.basename(file_path))[0]
+
+        with open(file_path, encoding='utf-8') as f:
+            pages.append((id, f.read()))
+
+    return pages
+
+
+def time_engine(pages, repeat, **kwargs):
+    """ Get the average seconds per page for a given engine """
+
+    # the product page reports missing fields with print
+    with contextlib.redirect_stdout(io.StringIO()):
+        start_time = time.perf_counter()
+
+        for _ in range(repeat):
+            for id, html in pages:
+                AmazonProductPage(id, html=html, **kwargs)
+
+        runtime = time.perf_counter() - start_time
+
+    return runtime / (repeat * len(pages))
+
+
+engines = {
+    'bs4': {'engine': 'bs4'},
+    'bs4 partial': {'engine': 'bs4', 'partial': True},
+    'lxml': {'engine': 'lxml'},
+}
+
+
+def run_benchmark(path=pages_dir, repeat=20):
+    """ Get the average seconds per page for each engine """
+
+    pages = load_pages(path)
+
+    if not pages:
+        print(f'no pages found in {path}')
+        return {}
+
+    return {f'product_page {name}': time_engine(pages, repeat, **kwargs) for name, kwargs in engines.items()}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', default=pages_dir, help='directory with product pages, one synthetic page by default')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'pages: {len(load_pages(args.pages))}, repeat: {args.repeat}')
+
+    results = run_benchmark(args.pages, args.repeat)
+
+    for name, seconds in results.items():
+        print(f'{name}: {seconds * 1000:.2f} ms per page, {results["product_page bs4"] / seconds:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
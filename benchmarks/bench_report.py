@@ -0,0 +1,137 @@
+""" Benchmark rendering the deals report: pandas Styler chains against the template renderer """
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_price_db import create_synthetic_price_db
+
+from deal_rules import DealRules
+from report_renderer import ReportRenderer
+from schema import apply_schema, price_columns, to_euros
+
+
+def create_last_date(number_of_books, seed=0):
+    """ Create the last date of a synthetic price history with the differences to the averages """
+
+    df = create_synthetic_price_db(number_of_books, 1, seed)
+    df = apply_schema(df)
+
+    # enough deals in every report section
+    rng = np.random.default_rng(seed)
+    df['average_price'] = (df['price'] * rng.uniform(0.9, 1.6, len(df))).round().astype('Int32')
+
+    df['diff_avg_price'] = df['price'] - df['average_price']
+    df['diff_avg_price_last_week'] = df['price'] - df['average_price_last_week']
+
+    return df
+
+
+def align_text(value):
+    """ Stand-in for Style.align_text: numbers to the right """
+
+    return 'text-align: right' if isinstance(value, (int, float)) else 'text-align: left'
+
+
+def highlight_if_lowest(df):
+    """ Stand-in for Style.highlight_if_lowest: prices equal to the lowest price """
+
+    lowest = df['Price'] <= df['Lowest']
+    styles = pd.DataFrame('', index=df.index, columns=df.columns)
+    styles.loc[lowest.fillna(False).to_numpy(dtype=bool), :] = 'background-color: lightgreen'
+
+    return styles
+
+
+def render_styler(reports):
+    """ The Styler path of create_html_report, one chain per report """
+
+    names = {
+        'title': 'Title', 'format': 'Format', 'price': 'Price', 'used_price': 'Used', 'average_price': 'Ø',
+        'average_price_last_week': 'Ø 7', 'diff_avg_price': 'Ø diff', 'diff_avg_price_last_week': 'Ø diff 7',
+        'lowest_price': 'Lowest', 'kindle_price': 'Kindle',
+    }
+
+    html = ''
+
+    for report, df in reports:
+        df = df.copy()
+        df['title'] = df.apply(lambda x: f'<a href="https://www.amazon.de/dp/{x.name[1]}">{x.iloc[0]}</a><code style="display:block">{x.name[1]}</code>', axis=1)
+
+        for column in df.columns.intersection(price_columns):
+            df[column] = to_euros(df[column])
+
+        df = df.rename(columns=names)[list(names.values())]
+
+        styler = df.style.\
+            set_table_attributes('class="table table-sm  align-middle"').\
+            set_table_styles([{'selector': 'th','props': [('background-color', 'yellow'), ('text-align', 'right') ]}]).\
+            set_properties(subset=['Format','Price', 'Ø', 'Ø diff', 'Ø 7', 'Ø diff 7', 'Lowest', 'Used', 'Kindle'], **{'width': '80px'}).\
+            set_properties(subset=['Title'], **{'width': '700px'})
+
+        # applymap, hide_index and render were renamed in pandas 2
+        styler = styler.map(align_text) if hasattr(styler, 'map') else styler.applymap(align_text)
+
+        if report.get('highlight_lowest'):
+            styler = styler.apply(highlight_if_lowest, axis=None, subset=['Price', 'Lowest'])
+
+        if hasattr(styler, 'hide_index'):
+            html += f'<b>{report["title"]}</b>' + styler.hide_index().render()
+        else:
+            html += f'<b>{report["title"]}</b>' + styler.hide(axis='index').to_html()
+
+    return html
+
+
+def run_benchmark(number_of_books=10000, repeat=3):
+    """ Get the best seconds of the Styler path and the template renderer """
+
+    df = create_last_date(number_of_books)
+    reports = DealRules().get_reports(df)
+    renderer = ReportRenderer()
+
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'report.html')
+
+        def write_styler():
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(render_styler(reports))
+
+        def write_template():
+            renderer.write(path, reports)
+
+        for name, write in (('styler', write_styler), ('template', write_template)):
+            runtimes = []
+
+            for _ in range(repeat):
+                start_time = time.perf_counter()
+                write()
+                runtimes.append(time.perf_counter() - start_time)
+
+            results[f'report {name}'] = min(runtimes)
+
+    return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for name, seconds in run_benchmark(args.books, args.repeat).items():
+        print(f'{name}: {seconds:.3f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+""" Benchmark adding a day of crawled rows to a multi-year price history """
+
+import argparse
+import time
+
+import pandas as pd
+
+from synthetic_price_db import create_synthetic_price_db
+
+
+def create_entries(df, date, number_of_rows):
+    """ Create new entries like the ones built from crawled product pages """
+
+    ids = df.index.get_level_values('id').unique()[:number_of_rows]
+
+    return [{
+        'date': date,
+        'id': id,
+        'title': f'Book {id}',
+        'format': 'Taschenbuch',
+        'target_price': None,
+        'price': 12.99,
+        'used_price': None,
+        'average_price': 13.5,
+        'average_price_last_week': 13.1,
+        'lowest_price': 11.99,
+        'kindle_price': 7.99,
+    } for id in ids]
+
+
+def add_rows_one_by_one(df, entries):
+    """ One full-frame copy per row, like DataFrame.append """
+
+    for entry in entries:
+        row = pd.DataFrame([entry]).set_index(['date', 'id'])
+        df = pd.concat([df, row])
+
+    return df
+
+
+def add_rows_buffered(df, entries):
+    """ Collect rows and concatenate them once """
+
+    buffer = []
+
+    for entry in entries:
+        buffer.append(entry)
+
+    new_rows = pd.DataFrame.from_records(buffer).set_index(['date', 'id']).reindex(columns=df.columns)
+
+    return pd.concat([df, new_rows])
+
+
+def run_benchmark(number_of_books=1000, number_of_days=3 * 365, number_of_rows=200):
+    """ Get the seconds to add the rows of a flush one by one and buffered """
+
+    df = create_synthetic_price_db(number_of_books, number_of_days)
+    entries = create_entries(df, '2099-01-01', number_of_rows)
+
+    results = {}
+
+    for name, add_rows in (('one by one', add_rows_one_by_one), ('buffered', add_rows_buffered)):
+        start_time = time.perf_counter()
+        add_rows(df, entries)
+        results[f'row_buffer {name}'] = time.perf_counter() - start_time
+
+    return results
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--books', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=3 * 365)
+    parser.add_argument('--rows', type=int, default=200, help='rows crawled per flush')
+    args = parser.parse_args()
+
+    print(f'history: {args.books * args.days} rows, new rows: {args.rows}')
+
+    for name, runtime in run_benchmark(args.books, args.days, args.rows).items():
+        print(f'{name}: {runtime:.3f} s')
+
+
+if __name__ == '__main__':
+    main()
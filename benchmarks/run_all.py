@@ -0,0 +1,109 @@
+""" Run all benchmarks and save the results with the git commit, so runs of different commits can be compared """
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+
+from datetime import datetime
+
+import pandas as pd
+
+import bench_deals_db
+import bench_goodreads
+import bench_price_db
+import bench_product_page
+import bench_report
+import bench_row_buffer
+
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+results_dir = os.path.join(benchmarks_dir, 'results')
+
+# benchmark -> (run_benchmark, arguments of a full run, arguments of a quick run)
+benchmarks = {
+    'product_page': (bench_product_page.run_benchmark, {'repeat': 20}, {'repeat': 2}),
+    'goodreads': (bench_goodreads.run_benchmark, {'repeat': 20}, {'repeat': 2}),
+    'row_buffer': (bench_row_buffer.run_benchmark, {'number_of_books': 1000}, {'number_of_books': 100}),
+    'report': (bench_report.run_benchmark, {'number_of_books': 10000}, {'number_of_books': 1000, 'repeat': 1}),
+    'price_db': (bench_price_db.run_benchmark, {'number_of_books': 10000}, {'number_of_books': 500, 'number_of_days': 365}),
+    'deals_db': (bench_deals_db.run_benchmark, {'number_of_books': 10000}, {'number_of_books': 500, 'number_of_days': 365}),
+}
+
+
+def get_git_commit():
+    """ Get the commit of the working tree and whether it has uncommitted changes """
+
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=benchmarks_dir, capture_output=True, text=True).stdout.strip()
+
+    try:
+        return git('rev-parse', 'HEAD') or 'unknown', bool(git('status', '--porcelain'))
+    except OSError:
+        return 'unknown', False
+
+
+def compare_results(results, previous_path):
+    """ Print the ratio to the results of a previous run, below 1 is faster """
+
+    with open(previous_path, encoding='utf-8') as f:
+        previous = json.load(f)
+
+    print(f'\ncompared to {previous["commit"][:10]} from {previous["date"]}:')
+
+    for name, seconds in results.items():
+        previous_seconds = previous['results'].get(name)
+
+        if previous_seconds:
+            print(f'{name}: {seconds / previous_seconds:.2f}x')
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--quick', action='store_true', help='small inputs, to check the benchmarks run')
+    parser.add_argument('--only', nargs='+', choices=list(benchmarks), default=list(benchmarks))
+    parser.add_argument('--compare', help='results file of a previous run')
+    args = parser.parse_args()
+
+    commit, dirty = get_git_commit()
+
+    results = {}
+
+    for name in args.only:
+        run_benchmark, arguments, quick_arguments = benchmarks[name]
+
+        print(f'running {name}')
+        results.update(run_benchmark(**(quick_arguments if args.quick else arguments)))
+
+    for name, seconds in results.items():
+        print(f'{name}: {seconds:.6f} s')
+
+    date = datetime.now()
+
+    run = {
+        'commit': commit,
+        'dirty': dirty,
+        'date': date.isoformat(timespec='seconds'),
+        'quick': args.quick,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f'{date.strftime("%Y-%m-%d_%H%M%S")}_{commit[:10]}.json')
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(run, f, indent=2)
+
+    print(f'results saved to {path}')
+
+    if args.compare:
+        compare_results(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+""" Create a synthetic price history with the columns of the book prices database """
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from price_storage import open_price_storage
+from schema import apply_schema
+
+
+columns = ['title', 'format', 'target_price', 'price', 'used_price', 'average_price', 'average_price_last_week', 'lowest_price', 'kindle_price']
+
+
+def create_synthetic_price_db(number_of_books=1000, number_of_days=365, seed=0):
+    """ Create a DataFrame indexed by (date, id) with string values, like a loaded csv """
+
+    rng = np.random.default_rng(seed)
+
+    ids = np.array([f'{i:010d}' for i in range(number_of_books)])
+    dates = pd.date_range('2018-01-01', periods=number_of_days).strftime('%Y-%m-%d').to_numpy()
+
+    # every book keeps a base price and changes it on some days
+    base_prices = rng.uniform(5, 60, number_of_books).round(2)
+    changes = rng.random((number_of_days, number_of_books)) < 0.05
+    factors = np.where(changes, rng.uniform(0.7, 1.1, (number_of_days, number_of_books)), 1).cumprod(axis=0)
+    prices = (base_prices * factors).round(2).ravel()
+
+    # no price found for a few entries
+    prices[rng.random(prices.size) < 0.02] = np.nan
+
+    kindle_prices = np.where(rng.random(prices.size) < 0.6, (prices * 0.6).round(2), np.nan)
+
+    def as_text(values):
+        return pd.Series(values).astype(str).where(pd.notna(values), None).to_numpy()
+
+    df = pd.DataFrame({
+        'date': np.repeat(dates, number_of_books),
+        'id': np.tile(ids, number_of_days),
+        'title': np.tile(np.array([f'Book {i}' for i in range(number_of_books)]), number_of_days),
+        'format': np.tile(rng.choice(['Taschenbuch', 'Gebundene Ausgabe'], number_of_books), number_of_days),
+        'target_price': None,
+        'price': as_text(prices),
+        'used_price': None,
+        'average_price': as_text((prices * 1.05).round(2)),
+        'average_price_last_week': as_text((prices * 1.02).round(2)),
+        'lowest_price': as_text((prices * 0.9).round(2)),
+        'kindle_price': as_text(kindle_prices),
+    })
+
+    return df.set_index(['date', 'id'])[columns]
+
+
+# file name of the price table per storage backend
+price_table_names = {
+    'csv': 'book_prices.csv',
+    'sqlite': 'book_prices.sqlite',
+    'parquet': 'book_prices',
+}
+
+
+def create_synthetic_databases(directory, number_of_books=1000, number_of_days=365, backend='csv', seed=0):
+    """ Write a book table, a price history and an empty deals table, returns db_infos with their paths """
+
+    df = apply_schema(create_synthetic_price_db(number_of_books, number_of_days, seed))
+
+    paths = SimpleNamespace(
+        books=os.path.join(directory, 'books.csv'),
+        book_prices=os.path.join(directory, price_table_names[backend]),
+        book_deals=os.path.join(directory, 'book_deals.csv'),
+        book_deals_report_html=os.path.join(directory, 'book_deals_report.html'),
+    )
+
+    books = df.loc[df.index.get_level_values('date')[-1]][['title', 'format', 'target_price']]
+    open_price_storage(paths.books, index=['id']).write(books)
+
+    open_price_storage(paths.book_prices).write(df)
+
+    pd.DataFrame(columns=['date', 'id', 'deal']).to_csv(paths.book_deals, index=False)
+
+    return SimpleNamespace(relative_paths=paths, absolute_paths=paths)
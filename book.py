@@ -1,18 +1,19 @@
 """ A class that can be used to represent a book from amazon """
 
 from book_goodreads import BookGoodreads
+from marketplace import default_marketplace
 
 
 class Book():
     """ A class representing an amazon book """
 
-    def __init__(self, id):
+    def __init__(self, id, http_client=None, book_goodreads=None, metadata_cache=None, marketplace=None):
         """ Initialize attributes """
         self.id = id
-        self.url = f'https://www.amazon.de/dp/{id}'
+        self.url = (marketplace or default_marketplace).get_product_url(id)
 
-        # initialize instance from goodreads book
-        self.book = BookGoodreads(self.id)
+        # initialize instance from goodreads book, unless it was already requested in a batch
+        self.book = book_goodreads or BookGoodreads(self.id, http_client, metadata_cache)
 
         self.title = self.book.title
         self.author = self.book.author
@@ -6,21 +6,27 @@ import numpy as np
 from datetime import datetime
 
 from book import Book
+from book_goodreads import get_books_from_goodreads
+from price_storage import open_price_storage
+from schema import price_to_cents
 
 
 class BookDatabase():
     """ A class representing a book database """
 
 
-    def __init__(self, book_db_path):
+    def __init__(self, book_db_path, http_client=None, metadata_cache=None):
         
         self.book_db_path = book_db_path  
+        self.http_client = http_client
+        self.metadata_cache = metadata_cache
         self.date = datetime.now().strftime('%Y-%m-%d')
 
-        self.df = pd.read_csv(self.book_db_path, header=0, dtype='str')
+        # csv file or sqlite database, chosen from the path
+        self.storage = open_price_storage(self.book_db_path, index=['id'])
 
-        # set index to id
-        self.df = self.df.set_index('id')  
+        # DataFrame with index id
+        self.df = self.storage.load()
 
         self.unique_ids = self.df.index.unique()
         self.length = len(self.unique_ids)
@@ -55,17 +61,17 @@ class BookDatabase():
         """ Write db as a csv file """
 
         self.log_db()
-        self.df.to_csv(self.book_db_path)
+        self.storage.write(self.df)
         
     
-    def add_entry_to_book_db(self, id):
+    def add_entry_to_book_db(self, id, book_goodreads=None):
         """ Add book to database """
             
         if self.check_id(id):
             print('id already in the db')
             return None
         
-        b = Book(id)
+        b = Book(id, self.http_client, book_goodreads, self.metadata_cache)
         
         # create variable for date added
         date_added = self.date
@@ -78,12 +84,28 @@ class BookDatabase():
             b.publication_year, 
             b.publisher, 
             b.pages, 
-            b.target_price
+            price_to_cents(b.target_price)
             ]
         
         return True
 
     
+    def add_entries_to_book_db(self, ids):
+        """ Add several books to database, requesting goodreads concurrently """
+
+        new_ids = [id for id in ids if not self.check_id(id)]
+
+        books_goodreads = get_books_from_goodreads(new_ids, self.http_client, self.metadata_cache)
+
+        for id, book_goodreads in books_goodreads.items():
+            if book_goodreads is None:
+                continue
+
+            self.add_entry_to_book_db(id, book_goodreads)
+
+        return True
+
+    
     def divide_list_in_buckets(self, a_list, length):
         """ Divide a given list in groups """
 
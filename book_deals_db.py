@@ -8,26 +8,35 @@ from pandas import DataFrame, Series
 
 from book import Book
 from book_db import BookDatabase
-from book_prices_db import BookPricesDatabase
 from amazon_product_page import AmazonProductPage
-from style import Style
 from html_tools import HTMLTools
 
 from open_url_in_safari import open_url_in_safari
+from marketplace import default_marketplace, get_marketplace_path
+from price_storage import open_price_storage
+from deal_rules import DealRules, default_deal_reports
+from report_renderer import ReportRenderer, content_marker
 
 
 class BookDealsDatabase():
     """ A class representing a database of book deals """
 
-    def __init__(self, db_infos):
+    # columns of the price table used in the report
+    report_columns = ['title', 'format', 'price', 'used_price', 'average_price', 'average_price_last_week', 'lowest_price', 'kindle_price']
+
+
+    def __init__(self, db_infos, marketplace=None):
         
         self.db_infos = db_infos
-        self.book_deals_db_path = db_infos.relative_paths.book_deals
-        #self.book_prices_db_path = db_infos.relative_paths.book_prices
 
-        # BookPricesDatabase
-        self.book_prices_db = BookPricesDatabase(db_infos)
-        self.book_prices_db.df = self.book_prices_db.df[['title', 'format', 'price', 'used_price', 'average_price', 'average_price_last_week', 'lowest_price', 'kindle_price']]
+        # deals of one marketplace, from its own price table
+        self.marketplace = marketplace or default_marketplace
+
+        self.book_deals_db_path = get_marketplace_path(db_infos.relative_paths.book_deals, self.marketplace)
+        self.book_prices_db_path = get_marketplace_path(db_infos.relative_paths.book_prices, self.marketplace)
+
+        # only the rows of the latest crawl date are read from the price table, not the history
+        self.book_prices_storage = open_price_storage(self.book_prices_db_path)
         
         # create a DataFrame with the latest date from BookPricesDatabase
         self.book_prices_db_last_date = None
@@ -35,10 +44,11 @@ class BookDealsDatabase():
         # BookDealsDatabase
         self.date = datetime.now().strftime('%Y-%m-%d')
 
-        self.df = pd.read_csv(self.book_deals_db_path, header=0, dtype='str')
+        # csv file, sqlite database or parquet directory, chosen from the path
+        self.storage = open_price_storage(self.book_deals_db_path)
 
-        # set MultiIndex to date and id
-        self.df = self.df.set_index(['date', 'id'])  
+        # DataFrame with MultiIndex date and id
+        self.df = self.storage.load()
 
         self.unique_dates = self.df.index.get_level_values('date').unique()
         self.unique_ids = self.df.index.get_level_values('id').unique()
@@ -49,6 +59,12 @@ class BookDealsDatabase():
         # daily_deals
         self.deals_of_the_day = None
 
+        # deal rules from the config, the tiers used so far otherwise
+        self.deal_rules = DealRules(getattr(db_infos, 'deal_reports', None) or default_deal_reports)
+
+        # html tables from a template, links and prices formatted per column
+        self.report_renderer = ReportRenderer(self.marketplace)
+
         self.get_last_date_from_db()
 
         self.create_df_last_date()
@@ -78,10 +94,11 @@ class BookDealsDatabase():
 
     
     def create_df_last_date(self):
-        
-        last_date_pattern = self.book_prices_db.df.loc[self.book_prices_db.last_date : self.book_prices_db.last_date]
+        """ Load the prices of the latest crawl date: tail of a csv file, last partition or sqlite index """
+
+        # with the adaptive schedule books not due on the last date have no row and are not in the report
 
-        self.book_prices_db_last_date = last_date_pattern.copy()
+        self.book_prices_db_last_date = self.book_prices_storage.load_last_date(columns=self.report_columns)
 
     
     #def change_variables(self):
@@ -103,8 +120,8 @@ class BookDealsDatabase():
     def calculate_difference_price_and_target_price(self):
         """ Compare price and target price from BookPricesDatabase """
 
-        price = self.book_prices_db_last_date.loc[ : , 'price'].astype(float)
-        target_price = self.book_prices_db_last_date.loc[ : , 'target_price'].astype(float)
+        price = self.book_prices_db_last_date.loc[ : , 'price']
+        target_price = self.book_prices_db_last_date.loc[ : , 'target_price']
         difference = price - target_price
 
         pattern_calculate_difference = difference
@@ -114,8 +131,8 @@ class BookDealsDatabase():
     def calculate_percent_from_price_and_target_price(self):
         """ Calculate the difference in percent between price and target price """
 
-        price =  self.book_prices_db_last_date.loc[ : , 'price'].astype(float)
-        target_price = self.book_prices_db_last_date.loc[ : , 'target_price'].astype(float)
+        price =  self.book_prices_db_last_date.loc[ : , 'price']
+        target_price = self.book_prices_db_last_date.loc[ : , 'target_price']
         difference = price - target_price
         pct = difference / price * 100
         pct_rounded = round(pct, 2)
@@ -124,16 +141,16 @@ class BookDealsDatabase():
 
 
     def calculate_difference_from_price_and_average_price(self):
-        price =  self.book_prices_db_last_date.loc[ : , 'price'].astype(float)
-        average_price = self.book_prices_db_last_date.loc[ : , 'average_price'].astype(float)
+        price =  self.book_prices_db_last_date.loc[ : , 'price']
+        average_price = self.book_prices_db_last_date.loc[ : , 'average_price']
         difference = price - average_price
         pattern_calculate_difference = difference
         self.book_prices_db_last_date.loc[ : , 'diff_avg_price'] = pattern_calculate_difference
     
     
     def calculate_difference_from_price_and_average_price_last_week(self):
-        price =  self.book_prices_db_last_date.loc[ : , 'price'].astype(float)
-        average_price_last_week = self.book_prices_db_last_date.loc[ : , 'average_price_last_week'].astype(float)
+        price =  self.book_prices_db_last_date.loc[ : , 'price']
+        average_price_last_week = self.book_prices_db_last_date.loc[ : , 'average_price_last_week']
         difference = price - average_price_last_week
         pattern_calculate_difference = difference
         self.book_prices_db_last_date.loc[ : , 'diff_avg_price_last_week'] = pattern_calculate_difference
@@ -148,146 +165,19 @@ class BookDealsDatabase():
     def create_html_report(self):
 
         df = self.deals_of_the_day
-        
-        # apply goes through every row (x) and use x.name for getting the id
-        #df['url'] = df.apply(lambda x: f'https://www.amazon.de/dp/{x.name[1]}', axis=1)
-        
-        # apply goes through every row (x) and builds a link for the title (x[0] with the amazon id (x.name[1])
-        df['title'] = df.apply(lambda x: f'<a href="https://www.amazon.de/dp/{x.name[1]}">{x[0]}</a><code style="display:block">{x.name[1]}</code>', axis=1)
-
-        #df = df[df['pct_target_price'] < 0].sort_values('pct_target_price')
-                
-        # not used anymore
-        #df_price_diff = df[df['diff_avg_price'] < -1.49].sort_values('diff_avg_price')
-        
-        #price_diff_pct = df['diff_avg_price'].astype(float) / df['price'].astype(float)
-        df_price_diff_pct = df[df['diff_avg_price'].astype(float) / df['average_price'].astype(float) < -0.10].sort_values('diff_avg_price')
-        
-        #df = df[df['pct_target_price'] < 10]
-        
-        # not used anymore
-        #df_price_diff_last_week = df[df['diff_avg_price_last_week'] < -1.49].sort_values('diff_avg_price_last_week')
-        
-        #df3 = df[df['price'].astype(float) < 10]
-
-        df_kindle_price = df[df['kindle_price'].astype(float) < 4].sort_values('kindle_price')
-
-        # maybe too complex?
-        prices50 = (df['price'].astype(float) > 50) & (df['diff_avg_price'].astype(float) < -10)
-        prices40 = ((df['price'].astype(float) > 30) & (df['price'].astype(float) <= 40)) & (df['diff_avg_price'].astype(float) < -5)
-        prices30 = ((df['price'].astype(float) > 20) & (df['price'].astype(float) <= 30)) & (df['diff_avg_price'].astype(float) < -5)
-        prices20 = ((df['price'].astype(float) > 10) & (df['price'].astype(float) <= 20)) & (df['diff_avg_price'].astype(float) < -2)
-        prices10 = (df['price'].astype(float) <= 10) & (df['diff_avg_price'].astype(float) < -1)
-        
-        """
-
-        price_g_50 = df['price'] > 50     
-
-        price_g_30 = df['price'] > 30
-        price_g_20 = df['price'] > 20
-        price_g_10 = df['price'] > 10
-
-        price_l_40 = df['price'] <= 40
-        price_l_30 = df['price'] <= 30
-        price_l_20 = df['price'] <= 20
 
-        prices50 = (price_u_50) & (df['diff_avg_price'] < -10) 
-        
-        prices40 = ((price_g_30) & (price_l_40)) & (df['diff_avg_price'] < -5)
-        prices30 = ((price_g_20) & (price_l_30)) & (df['diff_avg_price'] < -5)
-        prices20 = ((price_g_10) & (price_l_20)) & (df['diff_avg_price'] < -2)
-        
-        prices10 = (df['price'] <= 10) & (df['diff_avg_price'] < -1)
-        
-        """
+        # all deal rules are evaluated in one pass over the last date
+        reports = self.deal_rules.get_reports(df)
 
-        df_prices = df[prices50 | prices40 | prices30 | prices20 | prices10]
-
-        def change_names(df):
-        
-            names = {
-                'title':'Title',
-                'format':'Format', 
-                'price':'Price', 
-                'used_price':'Used', 
-                'average_price':'Ø', 
-                'average_price_last_week':'Ø 7',
-                'diff_avg_price':'Ø diff',
-                'diff_avg_price_last_week':'Ø diff 7',
-                'lowest_price':'Lowest',
-                'kindle_price':'Kindle'
-                }
-
-            df = df.rename(columns=names)
-            df = df[['Title', 'Format', 'Price', 'Ø', 'Ø diff', 'Ø 7', 'Ø diff 7', 'Lowest', 'Used', 'Kindle']]
-
-            return df
-
-        # html style
-        style_functions = Style()
-                
-
-        df_price_diff_pct = change_names(df_price_diff_pct)
-        
-        html2 = df_price_diff_pct.style.\
-            set_table_attributes('class="table table-sm  align-middle"').\
-            set_table_styles([{'selector': 'th','props': [('background-color', 'yellow'), ('text-align', 'right') ]}]).\
-            set_properties(subset=['Format','Price', 'Ø', 'Ø diff', 'Ø 7', 'Ø diff 7', 'Lowest', 'Used', 'Kindle'], **{'width': '80px'}).\
-            set_properties(subset=['Title'], **{'width': '700px'}).\
-            applymap(style_functions.align_text).\
-            apply(style_functions.highlight_if_lowest, axis=None, subset=['Price', 'Lowest']).\
-            hide_index().\
-            render()
-
-        
-        df_kindle_price = change_names(df_kindle_price)
-        
-        html4 = df_kindle_price.style.\
-            set_table_attributes('class="table table-sm  align-middle"').\
-            set_table_styles([{'selector': 'th','props': [('background-color', 'yellow'), ('text-align', 'right') ]}]).\
-            set_properties(subset=['Format','Price', 'Ø', 'Ø diff', 'Ø 7', 'Ø diff 7', 'Lowest', 'Used', 'Kindle'], **{'width': '80px'}).\
-            set_properties(subset=['Title'], **{'width': '700px'}).\
-            applymap(style_functions.align_text).\
-            hide_index().\
-            render()
-        
-        df_prices = change_names(df_prices)
-
-        html5 = df_prices.style.\
-            set_table_attributes('class="table table-sm  align-middle"').\
-            set_table_styles([{'selector': 'th','props': [('background-color', 'yellow'), ('text-align', 'right') ]}]).\
-            set_properties(subset=['Format','Price', 'Ø', 'Ø diff', 'Ø 7', 'Ø diff 7', 'Lowest', 'Used', 'Kindle'], **{'width': '80px'}).\
-            set_properties(subset=['Title'], **{'width': '700px'}).\
-            applymap(style_functions.align_text).\
-            apply(style_functions.highlight_if_lowest, axis=None, subset=['Price', 'Lowest']).\
-            hide_index().\
-            render()
-        
-        
+        # the page layout comes from HTMLTools, the tables are streamed into it at the marker
         html_tools = HTMLTools()
+        html_page = html_tools.create_html_page(content_marker)
 
-        html2 = html_tools.create_html_element('b', 'Percent from Difference from Average (0.10)') + html2
-        html4 = html_tools.create_html_element('b', 'Kindle Price') + html4
-        html5 = html_tools.create_html_element('b', 'Difference from Average depending on Price') + html5
-
-
-        
-        html = html2 + html4 + html5
-
-        
-
-        div_main_content = html_tools.create_html_element('div', html, classes='col-8')
-        div_space = html_tools.create_html_element('div', '', classes='col-2')
-        div_row = html_tools.create_html_element('div', div_space + div_main_content + div_space, classes='row')
-        div_container = html_tools.create_html_element('div', div_row, classes='table-responsive')
-        
-        html_page = html_tools.create_html_page(html)
+        self.report_renderer.write(
+            get_marketplace_path(self.db_infos.relative_paths.book_deals_report_html, self.marketplace), reports, page=html_page,
+        )
 
-
-        with open(self.db_infos.relative_paths.book_deals_report_html, 'w', encoding='utf-8') as html_report:
-            html_report.write(html_page)
-        
-        open_url_in_safari(self.db_infos.absolute_paths.book_deals_report_html)
+        open_url_in_safari(get_marketplace_path(self.db_infos.absolute_paths.book_deals_report_html, self.marketplace))
 
 
     def add_variable_to_db(self, variable):
@@ -303,7 +193,7 @@ class BookDealsDatabase():
         self.log_db()
         
         # consider using na_rep='NA'
-        self.df.to_csv(self.book_deals_db_path)
+        self.storage.write(self.df)
 
     
     def run(self):
@@ -1,17 +1,26 @@
 """ A class that can be used to represent a book from goodreads """
 
-import requests
 import bs4
 
+from concurrent.futures import ThreadPoolExecutor
+
+from http_client import get_default_http_client
 from settings import key
 
 
+# book information stored in the metadata cache
+information_fields = ['title', 'author', 'publisher', 'isbn13', 'publication_year', 'pages', 'format']
+
+
 class BookGoodreads():
     """ A class representing a book from goodreads """
 
-    def __init__(self, amz_id):
+    def __init__(self, amz_id, http_client=None, metadata_cache=None, rate_limiter=None):
         
         self.amz_id = amz_id
+        self.http_client = http_client or get_default_http_client()
+        self.metadata_cache = metadata_cache
+        self.rate_limiter = rate_limiter
         self.id = None
 
         self.url = f'https://www.goodreads.com/book/isbn/{self.amz_id}'
@@ -25,6 +34,10 @@ class BookGoodreads():
         self.format = None
 
         self.missing_information = None
+
+        # book information from an earlier request
+        if self.get_book_information_from_cache():
+            return None
         
         # call function to assign a value to id
         self.get_id(self.amz_id)
@@ -32,12 +45,49 @@ class BookGoodreads():
         # call function to assign values to book information
         self.get_book_information()
 
+        if self.metadata_cache and not self.missing_information:
+            self.metadata_cache.put(self.amz_id, self.id, self.get_information())
+
+
+    def get_book_information_from_cache(self):
+        """ Get id and book information from the metadata cache """
+
+        if not self.metadata_cache:
+            return False
+
+        cached = self.metadata_cache.get(self.amz_id)
+
+        if not cached:
+            return False
+
+        self.id, information = cached
+
+        for field in information_fields:
+            setattr(self, field, information.get(field))
+
+        return True
+
+
+    def get_information(self):
+        """ Get book information as a dict """
+
+        return {field: getattr(self, field) for field in information_fields}
+
+
+    def request(self, url, params):
+        """ Request goodreads, paced by the rate limiter if one is given """
+
+        if self.rate_limiter:
+            self.rate_limiter.acquire(url)
+
+        return self.http_client.get(url, params=params)
+
 
     def get_id(self, isbn):
         """ Get a goodreads id using a book isbn """
 
         url = 'https://www.goodreads.com/book/isbn_to_id'
-        r = requests.get(url, params={'key':key, 'isbn':isbn})
+        r = self.request(url, params={'key':key, 'isbn':isbn})
 
         self.id = r.text
 
@@ -45,7 +95,7 @@ class BookGoodreads():
     def get_book_information(self):
         """ Get book information from goodreads"""
       
-        r = requests.get(self.url, params={'key':key, 'format':'xml'})   
+        r = self.request(self.url, params={'key':key, 'format':'xml'})   
         soup = bs4.BeautifulSoup(r.text, 'xml')
 
         # TODO: more elegant way
@@ -68,6 +118,24 @@ class BookGoodreads():
         self.format = book.find('format').get_text(strip=True)
                 
 
+def get_books_from_goodreads(isbns, http_client=None, metadata_cache=None, rate_limiter=None, max_workers=8):
+    """ Get books from goodreads for a list of isbns concurrently, returns a dict isbn -> BookGoodreads """
+
+    def get_book(isbn):
+        try:
+            return BookGoodreads(isbn, http_client, metadata_cache, rate_limiter)
+        except Exception as e:
+            print(f'cannot retrieve information from goodreads for id {isbn}: {e}')
+            return None
+
+    unique_isbns = list(dict.fromkeys(isbns))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        books = executor.map(get_book, unique_isbns)
+
+        return dict(zip(unique_isbns, books))
+
+
 #bg = BookGoodreads('0374275637')
 #bg = BookGoodreads('')
 
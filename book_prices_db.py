@@ -3,6 +3,8 @@
 import pandas as pd
 import numpy as np
 
+import asyncio
+import os
 import random
 import time
 
@@ -12,31 +14,113 @@ from pandas import DataFrame, Series
 from book import Book
 from book_db import BookDatabase
 from amazon_product_page import AmazonProductPage
+from crawl_pipeline import CrawlPipeline
+from crawl_scheduler import CrawlScheduler
+from crawl_journal import CrawlJournal
+from lease_queue import LeaseQueue, get_worker_name
+from marketplace import default_marketplace, get_marketplace_path
+from crawl_metrics import CrawlMetrics
+from http_client import HTTPClient
+from page_cache import PageCache
+from price_statistics import PriceStatistics
+from price_storage import open_price_storage
+from schema import apply_schema, book_prices_columns, concat_rows, price_to_cents
+from rate_limiter import RateLimiter
+from runtime_forecast import CrawlHistory, RuntimeForecast
 
 
 class BookPricesDatabase():
     """ A class representing a database of book prices """
 
-    def __init__(self, db_infos):
+    def __init__(self, db_infos, storage=None, marketplace=None):
+
+        # storefront crawled by this database, other marketplaces keep their prices in their own tables
+        self.marketplace = marketplace or default_marketplace
         
+        # async crawl: same average request rate as the fixed waiting times, without the sleeps
+        # pipeline crawl: async fetches, parsing in a process pool and a single writer
+        # queue crawl: several worker processes claim ids from a shared lease queue
+        self.crawl_mode = 'serial'
+        self.concurrency = 4
+
+        # latencies, field extraction hits and flush times of the run, written as a report at the end of run()
+        self.metrics = CrawlMetrics()
+
+        # one keep-alive connection per concurrent request to amazon, shared with goodreads lookups
+        self.http_client = HTTPClient(host_pool_sizes={self.marketplace.domain: self.concurrency, 'www.goodreads.com': 2}, metrics=self.metrics)
+
+        # raw product pages of the last days, a crashed or repeated run is served from disk
+        self.page_cache = PageCache(get_marketplace_path('cache/pages', self.marketplace))
+
         # BookDatabase
-        self.book_db = BookDatabase(db_infos.relative_paths.books)
+        self.book_db = BookDatabase(db_infos.relative_paths.books, self.http_client)
         
         # BookPricesDatabase
-        self.book_prices_db_path = db_infos.relative_paths.book_prices
+        self.book_prices_db_path = get_marketplace_path(db_infos.relative_paths.book_prices, self.marketplace)
         self.date = datetime.now().strftime('%Y-%m-%d')
 
-        self.df = pd.read_csv(self.book_prices_db_path, header=0, dtype='str')
+        # csv file, sqlite database or parquet directory partitioned by date, chosen from the path
+        self.storage = storage or open_price_storage(self.book_prices_db_path)
+
+        # DataFrame with MultiIndex date and id
+        if self.storage.indexed:
+            # lookups are index seeks in the storage, only the last crawl date is kept in memory
+            self.df = self.storage.load_last_date()
+        else:
+            self.df = self.storage.load()
+
+        # e.g. a marketplace crawled for the first time
+        if not len(self.df.columns):
+            self.df = apply_schema(self.df.reindex(columns=book_prices_columns), prices_in_cents=True)
+
+        # 'append': write only the rows crawled since the last flush, 'snapshot': rewrite the whole table
+        self.write_mode = 'append'
+        self.snapshot_needed = False
 
-        # set MultiIndex to date and id
-        self.df = self.df.set_index(['date', 'id'])  
+        # rows crawled since the last flush, added to the DataFrame and the storage in one batch
+        self.row_buffer = []
 
-        self.unique_dates = self.df.index.get_level_values('date').unique()
-        self.unique_ids = self.df.index.get_level_values('id').unique()
+        # every buffered row is also on disk in the journal, a crashed run is resumed from it
+        self.crawl_journal = CrawlJournal(f'{os.path.splitext(self.book_prices_db_path)[0]}_journal.jsonl')
+
+        # running price statistics per id, persisted alongside the price table
+        statistics_path = f'{os.path.splitext(self.book_prices_db_path)[0]}_statistics.json'
+        self.price_statistics = PriceStatistics(statistics_path)
+
+        if self.storage.indexed:
+            if not self.price_statistics.load(self.storage.count(), self.storage.get_price_total()):
+                self.price_statistics.build(self.storage.load(columns=['price'])['price'])
+
+            self.unique_dates = pd.Index(self.storage.get_dates())
+            self.unique_ids = pd.Index(self.storage.get_ids())
+
+        else:
+            if not self.price_statistics.load(len(self.df), int(self.df['price'].sum())):
+                self.price_statistics.build(self.df['price'])
+
+            self.unique_dates = self.df.index.get_level_values('date').unique()
+            self.unique_ids = self.df.index.get_level_values('id').unique()
 
         self.length = len(self.unique_ids)
         self.last_date = None
 
+        # 'fixed': every id every day in catalog order
+        # 'adaptive': only ids due by their price change history, ids close to a deal first,
+        # the deals report only shows the ids crawled on the last date
+        self.schedule_mode = 'fixed'
+        self.crawl_scheduler = CrawlScheduler(self.price_statistics)
+
+        # buckets of ids crawled in this run
+        self.id_buckets = None
+
+        # second stage: Kindle editions found on the product pages of the run, each crawled once per date
+        self.kindle_crawl = False
+
+        # Kindle ASIN -> id of the first book it was found on, shared editions are requested once
+        self.kindle_editions = {}
+
+        self.build_membership_index()
+
         self.unique_ids_last_date = None
         self.unique_ids_for_today = None
 
@@ -44,6 +128,17 @@ class BookPricesDatabase():
         self.max_waiting_time_between_ids = 10
 
         self.waiting_time_between_buckets = 600
+
+        self.requests_per_second = self.marketplace.requests_per_second or 2 / (self.min_waiting_time_between_ids + self.max_waiting_time_between_ids)
+        self.rate_limiter = RateLimiter(self.requests_per_second)
+
+        # 'fixed': waiting times and buckets as configured above
+        # 'auto': pacing and bucket sizes chosen from the latencies of past runs to fit the time window
+        self.pacing_mode = 'fixed'
+
+        # latencies and error rates of past runs, the runtime forecast is based on them
+        self.crawl_history = CrawlHistory(f'{os.path.splitext(self.book_prices_db_path)[0]}_crawl_history.json')
+        self.runtime_forecast = RuntimeForecast(self.crawl_history, time_window=8 * 60 * 60, request_budget=None)
         
         self.runtime = None
 
@@ -63,9 +158,21 @@ class BookPricesDatabase():
     
 
     def log_db(self):
-        """ Log database """
-        
-        self.df.to_csv(f'log/amz_book_prices_db_{self.date}.csv')
+        """ Log database, at most once per day """
+
+        if self.storage.indexed:
+            log_path = get_marketplace_path(f'log/amz_book_prices_db_{self.date}.sqlite', self.marketplace)
+        else:
+            log_path = get_marketplace_path(f'log/amz_book_prices_db_{self.date}.csv', self.marketplace)
+
+        if os.path.exists(log_path):
+            return None
+
+        # the table in memory is only a slice for indexed storage, so the database itself is copied
+        if self.storage.indexed:
+            self.storage.backup(log_path)
+        else:
+            self.df.to_csv(log_path)
 
     
     def check_date(self, date):
@@ -80,21 +187,41 @@ class BookPricesDatabase():
     def check_id_in_date(self, id, date):
         """ Check if an id is stored for a given date """
 
-        if self.check_date(date):
-            
-            grouped = self.df.groupby(level='date')
-            ids = grouped.get_group(date).index.get_level_values('id').unique()
-
-            if id in ids:
-                return True
+        if id in self.get_ids_in_date(date):
+            return True
         
         return False    
 
+
+    def build_membership_index(self):
+        """ Build the sets of ids per date once, they are updated on every insert """
+
+        # date -> set of ids, for indexed storage filled per date on first use
+        self.ids_by_date = {}
+
+        if not self.storage.indexed and len(self.df):
+            index = self.df.index.to_frame(index=False)
+            self.ids_by_date = index.groupby('date')['id'].agg(set).to_dict()
+
+        self.ids_in_db = set(self.unique_ids)
+
+
+    def get_ids_in_date(self, date):
+        """ Get the set of ids stored for a given date """
+
+        if date not in self.ids_by_date:
+            if self.storage.indexed:
+                self.ids_by_date[date] = set(self.storage.get_ids_from_date(date))
+            else:
+                self.ids_by_date[date] = set()
+
+        return self.ids_by_date[date]
+
     
     def check_id(self, id):
         """ Check if a given id is already in the database """
 
-        if id in self.unique_ids:
+        if id in self.ids_in_db:
             #print('an id for this date is already in the database')
             return True
         
@@ -104,14 +231,11 @@ class BookPricesDatabase():
     def check_bucket_of_ids_in_date(self, bucket, date):
         """ check if a given group of ids is stored for a given date """
 
-        for id in bucket:
-            print(id)
-            if not self.check_id_in_date(id, date):
-                return False
-            
-            self.update_counter_id()
-        
-        print('id bucket already in date')
+        if not self.get_ids_in_date(date).issuperset(bucket):
+            return False
+
+        self.counter_id += len(bucket)
+        print(f'id bucket already in date: {self.counter_id} from {len(self.book_db.unique_ids)}')
         
         return True  
 
@@ -130,16 +254,7 @@ class BookPricesDatabase():
             print('id for price average not found')
             return np.nan
 
-        grouped = self.df['price'].astype(float).groupby(level='id')
-        prices = grouped.get_group(id)
-        
-        # TODO: find more elegant way to deal with no entries in prices
-        average_price = np.nan
-        
-        if prices.any():
-            average_price = prices.mean().round(2)
-
-        return average_price
+        return self.price_statistics.get_average(id)
 
     
     def calculate_average_last_week(self, id):
@@ -149,20 +264,8 @@ class BookPricesDatabase():
             print('id for price average not found')
             return np.nan
 
-        grouped = self.df['price'].astype(float).groupby(level='id')
-        prices = grouped.get_group(id)
-
-        # slice from all prices in the db (10 days)
-        prices_last_entries = prices[-10: ] 
-        
-        average_price_last_week = np.nan
-        
-        if prices.any():
-            average_price_last_week = prices_last_entries.rolling(window=7, min_periods=1).mean().round(2)[-1]
-        
-        # TODO: find more elegant way to deal with no entries in prices
-        
-        return average_price_last_week
+        # average of the last 7 entries, like a rolling mean with min_periods=1
+        return self.price_statistics.get_average_last_week(id)
         
 
     def calculate_lowest_price(self, id):
@@ -172,15 +275,7 @@ class BookPricesDatabase():
             print('id for lowest price not found')
             return np.nan
 
-        grouped = self.df['price'].astype(float).groupby(level='id')
-        prices = grouped.get_group(id)
-
-        lowest_price = np.nan
-
-        if prices.any():
-            lowest_price = prices.min()
-
-        return lowest_price
+        return self.price_statistics.get_lowest(id)
     
     
     def add_entry_to_book_prices_db(self, book_information):
@@ -193,46 +288,178 @@ class BookPricesDatabase():
             return None
 
         # initialize instance from amazon product page. get price as an attribute of the class 
-        amazon_product_page = AmazonProductPage(id)
+        amazon_product_page = AmazonProductPage(id, self.http_client, page_cache=self.page_cache, marketplace=self.marketplace)
+
+        self.add_product_page_to_book_prices_db(book_information, amazon_product_page)
+        
+        waiting_time = random.randrange(self.min_waiting_time_between_ids, self.max_waiting_time_between_ids)
+        print(f'waiting {waiting_time} seconds')
+        time.sleep(waiting_time)
+
+
+    def add_product_page_to_book_prices_db(self, book_information, amazon_product_page):
+        """ Add book information and a fetched product page to the database """
+
+        entry_for_book_prices_db = self.create_entry(book_information, amazon_product_page)
+
+        # on disk before the next request, a crash loses at most the request in flight
+        self.crawl_journal.append(entry_for_book_prices_db)
+        self.add_row(entry_for_book_prices_db)
+
+
+    def get_target_price(self, book_information):
+        """ Get the target price of a book in cents of the marketplace, None if it is set in another currency """
+
+        # the book table stores target prices in cents of the default marketplace, there are no exchange rates
+        if self.marketplace.currency != default_marketplace.currency:
+            return None
+
+        return book_information['target_price']
+
+
+    def create_entry(self, book_information, amazon_product_page):
+        """ Create the row of a fetched product page """
         
         """ 
-        Series consisting of the information stored in book_information, prices and average price
-        The name of the Series is the date (self.date) and the id (book_information.name), 
-        which will be used as index for an entry in the DataFrame
+        Record consisting of the information stored in book_information, prices and average price
+        The date (self.date) and the id (book_information.name) will be used as index 
+        for an entry in the DataFrame when the row buffer is flushed
         """
 
-        price = amazon_product_page.product_price
+        id = book_information.name
+
+        self.record_product_page(amazon_product_page)
+
+        if amazon_product_page.kindle_edition is not None:
+            self.kindle_editions.setdefault(amazon_product_page.kindle_edition, id)
+
+        # prices from the product page are euros, the table stores integer cents
+        price = price_to_cents(amazon_product_page.product_price)
         average_price = self.calculate_average_over_time(id)
         average_price_last_week = self.calculate_average_last_week(id)
         lowest_price = self.calculate_lowest_price(id)
-        kindle_price = amazon_product_page.kindle_price
+        kindle_price = price_to_cents(amazon_product_page.kindle_price)
         
         used_price = None
 
-        entry_for_book_prices_db = Series({
+        entry_for_book_prices_db = {
+            'date': self.date,
+            'id': id,
             'title': book_information['title'],
             'format': book_information['format'],
-            'target_price': book_information['target_price'],
+            'target_price': self.get_target_price(book_information),
             'price': price,
             'used_price': used_price,
             'average_price': average_price,
             'average_price_last_week': average_price_last_week,
             'lowest_price': lowest_price,
             'kindle_price': kindle_price
-        }, name=(self.date, book_information.name))
-        
-        self.df = self.df.append(entry_for_book_prices_db)
-        
-        waiting_time = random.randrange(7,10)
-        print(f'waiting {waiting_time} seconds')
-        time.sleep(waiting_time)
+        }
+
+        return entry_for_book_prices_db
+
+
+    def record_product_page(self, amazon_product_page):
+        """ Count the fields found on a product page and the time spent extracting them """
+
+        if amazon_product_page.parse_time is not None:
+            self.metrics.observe('parse_seconds', amazon_product_page.parse_time)
+
+        # a Kindle page only has its price, the other fields come from the book
+        if amazon_product_page.kindle:
+            self.metrics.record_field('kindle_page_price', amazon_product_page.product_price is not None)
+            return None
+
+        fields = {
+            'price': amazon_product_page.product_price,
+            'seller_infos': amazon_product_page.product_seller_infos,
+            'kindle_edition': amazon_product_page.kindle_edition,
+            'kindle_price': amazon_product_page.kindle_price,
+            'author': amazon_product_page.author,
+            'title': amazon_product_page.title,
+        }
+
+        for field, value in fields.items():
+            self.metrics.record_field(field, value is not None)
+
+        if amazon_product_page.product_price is None:
+            self.counter_price_not_found += 1
+
+        if amazon_product_page.kindle_price is None:
+            self.counter_kindle_not_found += 1
+
+
+    def get_kindle_information(self, kindle_id, amazon_product_page):
+        """ Get the book information for the row of a Kindle edition, like a row of the book database """
+
+        id = self.kindle_editions.get(kindle_id)
+
+        # title of the book it was found on, the page title if it was found by another worker
+        if id is not None:
+            title = self.book_db.get_book_information_from_book_db(id)['title']
+        else:
+            title = amazon_product_page.title
+
+        return Series({'title': title, 'format': 'Kindle', 'target_price': None}, name=kindle_id)
+
+
+    def add_row(self, entry):
+        """ Add a crawled row to the row buffer, the membership index and the statistics """
+
+        self.row_buffer.append(entry)
+        self.get_ids_in_date(entry['date']).add(entry['id'])
+        self.ids_in_db.add(entry['id'])
+        self.price_statistics.update(entry['id'], entry['price'], entry['date'])
+
+
+    def resume_from_journal(self):
+        """ Store the rows journaled by a run that did not finish """
+
+        entries = self.crawl_journal.read()
+
+        if not entries:
+            return None
+
+        # rows stored before the crash are already in the membership index
+        entries = [entry for entry in entries if not self.check_id_in_date(entry['id'], entry['date'])]
+
+        print(f'resuming {len(entries)} rows from the crawl journal')
+
+        for entry in entries:
+            self.add_row(entry)
+
+        self.write_csv()
 
     
+    def get_id_buckets(self):
+        """ Get the buckets of ids to crawl in this run """
+
+        if self.id_buckets is not None:
+            return self.id_buckets
+
+        if self.schedule_mode == 'adaptive':
+            target_prices = self.book_db.df['target_price'] if 'target_price' in self.book_db.df.columns else None
+
+            # target prices are cents of the default currency, not comparable to prices of other marketplaces
+            if self.marketplace.currency != default_marketplace.currency:
+                target_prices = None
+
+            ids = self.crawl_scheduler.schedule(self.book_db.unique_ids, self.date, target_prices)
+
+            print(f'ids due today: {len(ids)} from {len(self.book_db.unique_ids)}')
+
+            self.id_buckets = self.book_db.divide_list_in_buckets(ids, len(self.book_db.id_buckets))
+        else:
+            self.id_buckets = self.book_db.id_buckets
+
+        return self.id_buckets
+
+
     def crawl_all_id_buckets(self):
                     
         print(f'number of ids: {len(self.book_db.unique_ids)}')
 
-        for bucket in self.book_db.id_buckets:
+        for bucket in self.get_id_buckets():
 
             
             if self.check_bucket_of_ids_in_date(bucket, self.date):
@@ -253,6 +480,199 @@ class BookPricesDatabase():
             self.update_counter_id()
 
     
+    def crawl_all_id_buckets_async(self):
+        """ Crawl all id buckets concurrently, paced by the rate limiter instead of fixed sleeps """
+
+        print(f'number of ids: {len(self.book_db.unique_ids)}')
+        print(f'concurrency: {self.concurrency}, requests per second: {self.requests_per_second:.3f}')
+
+        asyncio.run(self.crawl_id_buckets_async(self.get_id_buckets()))
+
+
+    async def crawl_id_buckets_async(self, buckets):
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        for bucket in buckets:
+
+            if self.check_bucket_of_ids_in_date(bucket, self.date):
+                continue
+
+            await asyncio.gather(*[self.crawl_id_async(id, semaphore) for id in bucket])
+            self.write_csv()
+
+
+    async def crawl_id_async(self, id, semaphore, kindle=False):
+        """ Fetch a product page in a worker thread and add it to the database on the event loop """
+
+        if self.check_id_in_date(id, self.date):
+            print('id already found for this date')
+            return None
+
+        async with semaphore:
+            await self.rate_limiter.acquire_async(self.marketplace.get_product_url(id))
+
+            try:
+                amazon_product_page = await asyncio.to_thread(AmazonProductPage, id, self.http_client, page_cache=self.page_cache, kindle=kindle, marketplace=self.marketplace)
+            except Exception as e:
+                print(f'crawl failed for id {id}: {e}')
+                return None
+
+        if kindle:
+            book_information = self.get_kindle_information(id, amazon_product_page)
+        else:
+            book_information = self.book_db.get_book_information_from_book_db(id)
+
+        # DataFrame updates stay on the event loop thread
+        self.add_product_page_to_book_prices_db(book_information, amazon_product_page)
+
+        if not kindle:
+            self.update_counter_id()
+
+
+    def get_kindle_ids(self):
+        """ Get the Kindle editions found in this run that are not crawled yet for the date """
+
+        kindle_ids = [kindle_id for kindle_id in self.kindle_editions if not self.check_id_in_date(kindle_id, self.date)]
+
+        if self.schedule_mode == 'adaptive':
+            kindle_ids = [kindle_id for kindle_id in kindle_ids if self.crawl_scheduler.check_due(kindle_id, self.date)]
+
+        return kindle_ids
+
+
+    def crawl_kindle_editions(self):
+        """ Crawl the Kindle editions found on the product pages of this run, through the same rate limiter """
+
+        kindle_ids = self.get_kindle_ids()
+
+        print(f'kindle editions to crawl: {len(kindle_ids)} from {len(self.kindle_editions)} found')
+
+        if kindle_ids:
+            asyncio.run(self.crawl_kindle_ids_async(kindle_ids))
+
+
+    async def crawl_kindle_ids_async(self, kindle_ids):
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        # flushed in buckets of the same size as the books
+        bucket_size = max(1, len(self.book_db.id_buckets[0]))
+
+        for i in range(0, len(kindle_ids), bucket_size):
+            await asyncio.gather(*[self.crawl_id_async(kindle_id, semaphore, kindle=True) for kindle_id in kindle_ids[i:i + bucket_size]])
+            self.write_csv()
+
+
+    def crawl_all_id_buckets_pipeline(self):
+        """ Crawl all id buckets in fetch, parse and store stages """
+
+        print(f'number of ids: {len(self.book_db.unique_ids)}')
+
+        ids = [id for bucket in self.get_id_buckets() for id in bucket]
+
+        CrawlPipeline(self).run(ids)
+
+
+    def crawl_lease_queue(self):
+        """ Claim ids from the lease queue shared with other workers until every id of the date is done """
+
+        lease_queue = LeaseQueue(f'{os.path.splitext(self.book_prices_db_path)[0]}_queue.sqlite')
+        worker = get_worker_name()
+
+        # every worker adds the ids of the date, ids queued by another worker are kept as they are
+        ids = [id for bucket in self.get_id_buckets() for id in bucket if not self.check_id_in_date(id, self.date)]
+        lease_queue.enqueue(ids, self.date)
+
+        print(f'worker {worker}, ids in queue: {lease_queue.count(self.date)}')
+
+        self.work_lease_queue(lease_queue, worker)
+
+        # second stage: editions found by several workers are queued and requested once
+        if self.kindle_crawl:
+            kindle_ids = self.get_kindle_ids()
+            lease_queue.enqueue(kindle_ids, self.date)
+
+            print(f'worker {worker}, kindle editions found: {len(kindle_ids)}, ids in queue: {lease_queue.count(self.date)}')
+
+            self.work_lease_queue(lease_queue, worker)
+
+        print(f'worker {worker} done, ids in queue: {lease_queue.count(self.date)}')
+
+
+    def work_lease_queue(self, lease_queue, worker):
+        """ Crawl claimed ids until the queue is empty, ids not in the book database are Kindle editions """
+
+        rows_since_collect = 0
+        rows_per_collect = len(self.book_db.id_buckets[0])
+
+        while True:
+            leases = lease_queue.claim(worker, self.date)
+
+            if not leases:
+                counts = lease_queue.count(self.date)
+
+                # ids leased or results being stored by other workers are given back if their lease expires
+                if counts.get('leased') or counts.get('storing'):
+                    time.sleep(min(lease_queue.lease_time, 30))
+                    continue
+
+                break
+
+            for id, lease in leases:
+                kindle = id not in self.book_db.unique_ids
+
+                self.rate_limiter.acquire(self.marketplace.get_product_url(id))
+
+                try:
+                    amazon_product_page = AmazonProductPage(id, self.http_client, page_cache=self.page_cache, kindle=kindle, marketplace=self.marketplace)
+                except Exception as e:
+                    print(f'crawl failed for id {id}: {e}')
+                    lease_queue.fail(id, self.date, lease)
+                    continue
+
+                if kindle:
+                    book_information = self.get_kindle_information(id, amazon_product_page)
+                else:
+                    book_information = self.book_db.get_book_information_from_book_db(id)
+
+                # the lease expired and the id was given to another worker
+                if not lease_queue.complete(id, self.date, lease, self.create_entry(book_information, amazon_product_page)):
+                    print(f'lease expired for id {id}, result dropped')
+                    continue
+
+                if not kindle:
+                    self.update_counter_id()
+
+                rows_since_collect += 1
+
+            if rows_since_collect >= rows_per_collect:
+                lease_queue.collect(self.date, self.store_entries, worker)
+                rows_since_collect = 0
+
+        # results of all workers not stored yet
+        lease_queue.collect(self.date, self.store_entries, worker)
+
+
+    def store_entries(self, entries):
+        """ Store rows completed by the workers of the lease queue """
+
+        for entry in entries:
+            self.add_row(entry)
+
+        self.metrics.increment('rows_total', len(self.row_buffer))
+
+        # an exception up to here gives the rows back to the queue, they are collected again
+        with self.metrics.timer('flush_seconds'):
+            self.flush()
+
+        # the rows are stored, the next run rebuilds statistics that could not be saved
+        try:
+            self.price_statistics.save()
+        except OSError as e:
+            print(f'saving the price statistics failed: {e}')
+
+
     def update_counter_id(self):
         self.counter_id += 1
         print(f'{self.counter_id} from {len(self.book_db.unique_ids)}')
@@ -280,6 +700,11 @@ class BookPricesDatabase():
         # Add a new variable (Merkmal, Spalte) to the database 
         self.df[variable] = np.nan
 
+        if self.storage.indexed:
+            self.storage.add_column(variable)
+        else:
+            self.snapshot_needed = True
+
         # Add a new variable with groupby
         #self.df['lowest_price'] = self.df['price'].astype(float).groupby(level='id').transform('min')
         
@@ -291,37 +716,159 @@ class BookPricesDatabase():
         """ Delete variable from db """
 
         self.df = self.df.drop(variable, axis=1)
+
+        if self.storage.indexed:
+            self.storage.drop_column(variable)
+        else:
+            self.snapshot_needed = True
         
         # check with print before writing file
         #self.write_csv()
         
     
     def calculate_runtime(self):
-        """ Calculate runtime """
+        """ Forecast the runtime from the latencies and error rates of past runs """
 
         if not self.book_db.length:
             print('no ids found in database')
             return None
 
-        runtime_ids = self.book_db.length * self.max_waiting_time_between_ids
-        runtime_buckets = len(self.book_db.id_buckets) * self.waiting_time_between_buckets
-        self.runtime = runtime_ids + runtime_buckets
+        if self.pacing_mode == 'auto':
+            self.tune_pacing()
 
-        print(f'length: {self.book_db.length}')
+        # ids of this run, fewer than the catalog with the adaptive schedule
+        id_buckets = self.get_id_buckets()
+        length = sum(len(bucket) for bucket in id_buckets)
+
+        # mean of random.randrange(min, max)
+        waiting_time_between_ids = (self.min_waiting_time_between_ids + self.max_waiting_time_between_ids - 1) / 2
+
+        self.runtime = self.runtime_forecast.forecast(
+            length, self.crawl_mode, self.requests_per_second, self.concurrency,
+            waiting_time_between_ids, len(id_buckets), self.waiting_time_between_buckets,
+        )
+
+        print(f'length: {length}')
+        print(f'latency: {self.runtime_forecast.get_latency():.2f} s, error rate: {self.runtime_forecast.get_error_rate():.1%}')
         print(f'runtime: {self.runtime}')
         print(f'runtime in minutes: {self.runtime / 60}')
         print(f'runtime in hours: {self.runtime / 60 / 60}')
 
-        # TODO: consider time library
-    
+
+    def tune_pacing(self):
+        """ Keep the configured pacing and trim the ids to the time window and the request budget, a slow host
+        lowers the request rate but the pacing is never faster than configured """
+
+        id_buckets = self.get_id_buckets()
+        ids = [id for bucket in id_buckets for id in bucket if not self.check_id_in_date(id, self.date)]
+
+        requests_per_second = self.requests_per_second
+        waiting_time_between_buckets = 0
+        bucket_size = None
+
+        if self.crawl_mode == 'serial':
+            # one request after the other: the latency and the configured waiting times set the rate
+            waiting_time_between_ids = (self.min_waiting_time_between_ids + self.max_waiting_time_between_ids - 1) / 2
+            requests_per_second = min(requests_per_second, 1 / (self.runtime_forecast.get_latency() + waiting_time_between_ids))
+
+            # only the serial crawl sleeps between buckets, the buckets keep their size so it sleeps as often per id
+            waiting_time_between_buckets = self.waiting_time_between_buckets
+            bucket_size = max((len(bucket) for bucket in id_buckets), default=1)
+
+        plan = self.runtime_forecast.plan(
+            len(ids), self.crawl_mode, requests_per_second, self.concurrency, waiting_time_between_buckets, bucket_size,
+        )
+
+        if plan['ids'] < len(ids):
+            if plan['max_requests'] == self.runtime_forecast.request_budget:
+                limit = f'request budget of {self.runtime_forecast.request_budget}'
+            else:
+                limit = f'time window of {self.runtime_forecast.time_window / 60 / 60} hours'
+
+            print(f'{limit}: crawling {plan["ids"]} from {len(ids)} ids')
+
+        # serial crawls keep their waiting times, concurrent crawls are only slowed down by the latency
+        if self.crawl_mode != 'serial':
+            self.requests_per_second = plan['requests_per_second']
+            self.rate_limiter = RateLimiter(self.requests_per_second)
+
+        ids = ids[:plan['ids']]
+        bucket_size = plan['bucket_size']
+        self.id_buckets = [ids[i:i + bucket_size] for i in range(0, len(ids), bucket_size)]
+
+        print(f'pacing: {plan["requests_per_second"]:.3f} requests per second, buckets of {bucket_size} ids')
+
 
     def write_csv(self):
         """ Write db as a csv file """
 
+        self.metrics.increment('rows_total', len(self.row_buffer))
+
+        with self.metrics.timer('flush_seconds'):
+            self.write_table()
+
+
+    def write_table(self):
+        """ Store the crawled rows and the statistics """
+
+        if self.write_mode == 'append' and not self.snapshot_needed:
+            self.flush()
+        else:
+            self.write_snapshot()
+
+        self.price_statistics.save()
+
+
+    def flush_row_buffer(self):
+        """ Add the buffered rows to the DataFrame in one concatenation and return them """
+
+        if not self.row_buffer:
+            return None
+
+        new_rows = DataFrame.from_records(self.row_buffer).set_index(['date', 'id'])
+
+        # same column order as the stored table
+        if len(self.df.columns):
+            new_rows = new_rows.reindex(columns=self.df.columns)
+
+        new_rows = apply_schema(new_rows, prices_in_cents=True, categories=False)
+
+        self.df = concat_rows(self.df, new_rows)
+        self.row_buffer = []
+
+        return new_rows
+
+
+    def flush(self):
+        """ Append the rows crawled since the last flush """
+
+        new_rows = self.flush_row_buffer()
+
+        self.log_db()
+
+        if new_rows is None:
+            return None
+
+        self.storage.append(new_rows)
+        self.crawl_journal.clear()
+
+
+    def write_snapshot(self):
+        """ Rewrite the whole table, e.g. after deleting books or variables """
+
+        # indexed storage is changed in place and holds more than the table in memory
+        if self.storage.indexed:
+            self.flush()
+            return None
+
+        self.flush_row_buffer()
         self.log_db()
         
         # consider using na_rep='NA'
-        self.df.to_csv(self.book_prices_db_path)
+        self.storage.write(self.df)
+        self.crawl_journal.clear()
+
+        self.snapshot_needed = False
 
     
     def delete_book_from_book_prices_db(self, id):
@@ -333,29 +880,76 @@ class BookPricesDatabase():
         
         # also consider drop entries by creating a dataframe without the matching ids
         # df = df[df.id != id]
-        #        
-        self.df = self.df.drop(index=id, level=1)
+        #
+        # rows crawled but not flushed yet, the id may not be in the DataFrame at all
+        self.row_buffer = [row for row in self.row_buffer if row['id'] != id]
+        self.crawl_journal.rewrite(self.row_buffer)
+
+        # indexed storage only holds the last date in memory, the id can be stored on earlier dates only
+        self.df = self.df.drop(index=id, level=1, errors='ignore')
+
+        self.price_statistics.statistics.pop(id, None)
+
+        self.ids_in_db.discard(id)
+
+        for ids in self.ids_by_date.values():
+            ids.discard(id)
+
+        if self.storage.indexed:
+            self.storage.delete_id(id)
+            self.price_statistics.rows = self.storage.count()
+        else:
+            self.price_statistics.rows = len(self.df)
+            self.snapshot_needed = True
 
 
     def get_ids_from_date(self, date):
         """ Get all ids from a DataFrame given a date """
 
-        if self.df.loc[date : date].empty:
+        ids = self.get_ids_in_date(date)
+
+        if not ids:
             return None
-    
-        ids = self.df.loc[date : date].index.get_level_values('id').unique()
 
-        return ids
+        return pd.Index(sorted(ids))
 
     
-    def run(self):
+    def run(self, resume=True):
 
         start_time = time.time()
+
+        # rows of a crashed run are stored first, their ids are not requested again
+        if resume:
+            self.resume_from_journal()
+
         self.calculate_runtime()
-        
-        self.crawl_all_id_buckets()
 
-        print(f'runtime: {time.time() - start_time}')
+        if self.crawl_mode == 'async':
+            self.crawl_all_id_buckets_async()
+        elif self.crawl_mode == 'pipeline':
+            self.crawl_all_id_buckets_pipeline()
+        elif self.crawl_mode == 'queue':
+            self.crawl_lease_queue()
+        else:
+            self.crawl_all_id_buckets()
+
+        # the queue workers crawl the Kindle editions through the lease queue
+        if self.kindle_crawl and self.crawl_mode != 'queue':
+            self.crawl_kindle_editions()
+
+        runtime = time.time() - start_time
+
+        print(f'runtime: {runtime}')
+        print(f'price not found: {self.counter_price_not_found}, kindle price not found: {self.counter_kindle_not_found}')
+
+        # machine readable run report, the prometheus file is overwritten by every run
+        self.metrics.write(
+            get_marketplace_path(f'log/crawl_metrics_{self.date}.json', self.marketplace),
+            get_marketplace_path('log/crawl_metrics.prom', self.marketplace),
+        )
+
+        # latencies and errors of this run for the forecast of the next runs
+        self.crawl_history.record(self.metrics, self.marketplace.domain, self.date, runtime, self.counter_id, self.crawl_mode)
 
 
 from db_infos import choose_db
@@ -0,0 +1,82 @@
+""" A class that can be used to journal crawled rows until they are stored """
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def to_json(value):
+    """ Convert values json does not know, e.g. numpy integers and missing values """
+
+    if isinstance(value, np.integer):
+        return int(value)
+
+    if isinstance(value, np.floating):
+        return float(value)
+
+    if pd.isna(value):
+        return None
+
+    return str(value)
+
+
+class CrawlJournal():
+    """ A class representing a write-ahead journal of crawled rows, one json line per row """
+
+    def __init__(self, journal_path):
+
+        self.journal_path = journal_path
+
+
+    def append(self, entry):
+        """ Write a crawled row, it is on disk when the method returns """
+
+        line = json.dumps(entry, default=to_json, ensure_ascii=False)
+
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+    def read(self):
+        """ Read the journaled rows, a line torn by a crash is skipped """
+
+        if not os.path.exists(self.journal_path):
+            return []
+
+        entries = []
+
+        with open(self.journal_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f'skipping incomplete journal line: {line[:80]!r}')
+
+        return entries
+
+
+    def rewrite(self, entries):
+        """ Replace the journal, e.g. without the rows of a deleted book """
+
+        temporary_path = f'{self.journal_path}.tmp'
+
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, default=to_json, ensure_ascii=False) + '\n')
+
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temporary_path, self.journal_path)
+
+
+    def clear(self):
+        """ Empty the journal once its rows are stored """
+
+        with open(self.journal_path, 'w', encoding='utf-8') as f:
+            f.flush()
+            os.fsync(f.fileno())
@@ -0,0 +1,193 @@
+""" A class that can be used to record metrics of a crawl and write them as a run report """
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from contextlib import contextmanager
+
+
+# metric name -> (type, help) in the prometheus text format
+metric_infos = {
+    'requests_total': ('counter', 'HTTP requests by host and status'),
+    'response_bytes_total': ('counter', 'Bytes of response bodies by host'),
+    'request_seconds': ('summary', 'Latency of HTTP requests by host'),
+    'parse_seconds': ('summary', 'Time to parse a product page and extract its fields'),
+    'field_extractions_total': ('counter', 'Extracted fields of product pages by result (hit or miss)'),
+    'flush_seconds': ('summary', 'Time to store a batch of rows'),
+    'rows_total': ('counter', 'Rows added to the price table'),
+    'run_seconds': ('gauge', 'Runtime of the crawl'),
+}
+
+prefix = 'price_tracker'
+
+quantiles = [0.5, 0.9, 0.99]
+
+
+class CrawlMetrics():
+    """ A class representing counters and timing summaries of a crawl, safe to use from worker threads """
+
+    def __init__(self):
+
+        # (name, labels) -> value, labels are sorted (key, value) tuples
+        self.counters = {}
+        self.gauges = {}
+
+        # (name, labels) -> observed values
+        self.samples = {}
+
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+
+
+    def increment(self, name, value=1, **labels):
+
+        key = (name, tuple(sorted(labels.items())))
+
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+
+    def set(self, name, value, **labels):
+
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+
+    def observe(self, name, value, **labels):
+
+        key = (name, tuple(sorted(labels.items())))
+
+        with self.lock:
+            self.samples.setdefault(key, []).append(value)
+
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """ Observe the seconds spent in a block """
+
+        start_time = time.perf_counter()
+
+        try:
+            yield None
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+
+    def record_response(self, host, status, seconds, size):
+        """ Record a finished HTTP request """
+
+        self.increment('requests_total', host=host, status=str(status))
+        self.increment('response_bytes_total', size, host=host)
+        self.observe('request_seconds', seconds, host=host)
+
+
+    def record_field(self, field, found):
+        """ Record if a field was found on a product page, misses of every page point at a broken selector """
+
+        self.increment('field_extractions_total', field=field, result='hit' if found else 'miss')
+
+
+    def get_host_requests(self, host):
+        """ Get the number of requests by status and the latencies of the requests to a given host """
+
+        with self.lock:
+            statuses = {
+                dict(labels)['status']: value for (name, labels), value in self.counters.items()
+                if name == 'requests_total' and dict(labels).get('host') == host
+            }
+            latencies = list(self.samples.get(('request_seconds', (('host', host),)), []))
+
+        return statuses, latencies
+
+
+    def get_summary(self, values):
+
+        values = np.asarray(values, dtype='float64')
+
+        summary = {'count': int(values.size), 'sum': float(values.sum())}
+
+        for q in quantiles:
+            summary[str(q)] = float(np.quantile(values, q))
+
+        return summary
+
+
+    def get_report(self):
+        """ Get all metrics as a dictionary """
+
+        def get_name(name, labels):
+            if not labels:
+                return name
+
+            return name + '{' + ','.join(f'{key}={value}' for key, value in labels) + '}'
+
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            samples = {key: list(values) for key, values in self.samples.items()}
+
+        return {
+            'started_at': self.start_time,
+            'counters': {get_name(*key): value for key, value in sorted(counters.items())},
+            'gauges': {get_name(*key): value for key, value in sorted(gauges.items())},
+            'summaries': {get_name(*key): self.get_summary(values) for key, values in sorted(samples.items())},
+        }
+
+
+    def get_prometheus_text(self):
+        """ Get all metrics in the prometheus text exposition format """
+
+        def format_labels(labels):
+            if not labels:
+                return ''
+
+            return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            samples = {key: list(values) for key, values in self.samples.items()}
+
+        lines = []
+
+        for name, (metric_type, help_text) in metric_infos.items():
+            metric_name = f'{prefix}_{name}'
+            lines.append(f'# HELP {metric_name} {help_text}')
+            lines.append(f'# TYPE {metric_name} {metric_type}')
+
+            for (key, labels), value in sorted({**counters, **gauges}.items()):
+                if key == name:
+                    lines.append(f'{metric_name}{format_labels(labels)} {value}')
+
+            for (key, labels), values in sorted(samples.items()):
+                if key != name:
+                    continue
+
+                summary = self.get_summary(values)
+
+                for q in quantiles:
+                    lines.append(f'{metric_name}{format_labels(labels + (("quantile", str(q)),))} {summary[str(q)]}')
+
+                lines.append(f'{metric_name}_sum{format_labels(labels)} {summary["sum"]}')
+                lines.append(f'{metric_name}_count{format_labels(labels)} {summary["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+    def write(self, json_path, prometheus_path):
+        """ Write the run report as json and as a prometheus text file, e.g. for the node exporter """
+
+        self.set('run_seconds', time.time() - self.start_time)
+
+        for path, text in ((json_path, json.dumps(self.get_report(), indent=2)), (prometheus_path, self.get_prometheus_text())):
+            file_descriptor, temporary_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(path) or '.')
+
+            with os.fdopen(file_descriptor, 'w', encoding='utf-8') as f:
+                f.write(text)
+
+            os.replace(temporary_path, path)
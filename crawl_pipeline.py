@@ -0,0 +1,272 @@
+""" A class that can be used to crawl product pages in fetch, parse and store stages """
+
+import asyncio
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from amazon_product_page import AmazonProductPage, get_product_page_extractor
+from select_user_agent import select_user_agent
+
+
+def parse_product_page(html, marketplace):
+    """ Extract the fields of a product page, runs in a worker process """
+
+    return get_product_page_extractor(marketplace).extract(html)
+
+
+class StageCounter():
+    """ A class representing the throughput and backpressure counters of a pipeline stage """
+
+    def __init__(self, name):
+
+        self.name = name
+
+        # items done and failed, seconds spent working and seconds blocked on a full output queue
+        self.items = 0
+        self.failed = 0
+        self.busy_time = 0
+        self.blocked_time = 0
+
+
+    def get_throughput(self, runtime):
+        """ Get the items per second of the stage over the runtime of the pipeline """
+
+        if not runtime:
+            return 0
+
+        return self.items / runtime
+
+
+    def report(self, runtime):
+
+        print(f'{self.name}: {self.items} items, {self.failed} failed, {self.get_throughput(runtime):.2f} items/s, '
+              f'busy {self.busy_time:.1f} s, blocked {self.blocked_time:.1f} s')
+
+
+class CrawlPipeline():
+    """ A class representing a crawl with bounded queues between a fetch, a parse and a store stage """
+
+    def __init__(self, book_prices_db, fetch_workers=None, parse_workers=None, queue_size=None, flush_size=None):
+
+        self.book_prices_db = book_prices_db
+
+        # I/O bound: concurrent requests, paced by the rate limiter of the database
+        self.fetch_workers = fetch_workers or book_prices_db.concurrency
+
+        # CPU bound: one process per core
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+
+        # a full queue blocks the stage before it (backpressure), so pages never pile up in memory
+        self.queue_size = queue_size or 2 * max(self.fetch_workers, self.parse_workers)
+
+        # rows stored per flush of the single writer, one bucket by default
+        self.flush_size = flush_size or len(book_prices_db.book_db.id_buckets[0])
+
+        self.counters = {name: StageCounter(name) for name in ('fetch', 'parse', 'store')}
+
+        self.runtime = None
+
+
+    def fetch(self, id):
+        """ Get the html of a product page from the page cache or amazon and if it was requested, runs in a worker thread """
+
+        page_cache = self.book_prices_db.page_cache
+
+        html = page_cache.get(id, self.book_prices_db.date) if page_cache else None
+
+        if html is not None:
+            return html, False
+
+        headers = {'User-Agent': select_user_agent()}
+        response = self.book_prices_db.http_client.get(self.book_prices_db.marketplace.get_product_url(id), headers=headers)
+
+        return response.text, response.status_code == 200
+
+
+    def cache_page(self, id, html):
+        """ Store a requested page that was parsed as a product page, runs in a worker thread """
+
+        try:
+            self.book_prices_db.page_cache.put(id, self.book_prices_db.date, html)
+        except Exception as e:
+            print(f'caching the page failed for id {id}: {e}')
+
+
+    async def put(self, queue, item, counter):
+        """ Put an item into the next queue, time spent waiting for space is backpressure """
+
+        start_time = time.perf_counter()
+        await queue.put(item)
+        counter.blocked_time += time.perf_counter() - start_time
+
+
+    async def fetch_stage(self, id_queue, html_queue):
+
+        counter = self.counters['fetch']
+
+        while True:
+            id = await id_queue.get()
+
+            if id is None:
+                return None
+
+            await self.book_prices_db.rate_limiter.acquire_async(self.book_prices_db.marketplace.get_product_url(id))
+
+            start_time = time.perf_counter()
+
+            try:
+                html, fetched = await asyncio.to_thread(self.fetch, id)
+            except Exception as e:
+                print(f'fetch failed for id {id}: {e}')
+                counter.failed += 1
+                continue
+            finally:
+                counter.busy_time += time.perf_counter() - start_time
+
+            counter.items += 1
+            await self.put(html_queue, (id, html, fetched), counter)
+
+
+    async def parse_stage(self, html_queue, fields_queue, executor):
+
+        counter = self.counters['parse']
+        loop = asyncio.get_running_loop()
+
+        while True:
+            item = await html_queue.get()
+
+            if item is None:
+                return None
+
+            id, html, fetched = item
+            start_time = time.perf_counter()
+
+            try:
+                fields = await loop.run_in_executor(executor, parse_product_page, html, self.book_prices_db.marketplace)
+            except Exception as e:
+                print(f'parse failed for id {id}: {e}')
+                counter.failed += 1
+                continue
+            finally:
+                counter.busy_time += time.perf_counter() - start_time
+
+            # pages parsed in worker processes, including the transfer to and from the process
+            self.book_prices_db.metrics.observe('parse_seconds', time.perf_counter() - start_time)
+
+            # robot checks and captchas are answered with 200 too, they are not served from the cache
+            if fetched and self.book_prices_db.page_cache and (fields['title'] is not None or fields['product_price'] is not None):
+                await asyncio.to_thread(self.cache_page, id, html)
+
+            counter.items += 1
+            await self.put(fields_queue, (id, fields), counter)
+
+
+    async def store_stage(self, fields_queue):
+        """ The only stage that changes the database, a failed row is skipped, a failed write ends the crawl """
+
+        counter = self.counters['store']
+        book_prices_db = self.book_prices_db
+        rows_since_flush = 0
+
+        while True:
+            item = await fields_queue.get()
+
+            if item is None:
+                break
+
+            id, fields = item
+            start_time = time.perf_counter()
+
+            try:
+                book_information = book_prices_db.book_db.get_book_information_from_book_db(id)
+                amazon_product_page = AmazonProductPage(id, book_prices_db.http_client, fields=fields, marketplace=book_prices_db.marketplace)
+
+                book_prices_db.add_product_page_to_book_prices_db(book_information, amazon_product_page)
+            except Exception as e:
+                print(f'store failed for id {id}: {e}')
+                counter.failed += 1
+                counter.busy_time += time.perf_counter() - start_time
+                continue
+
+            book_prices_db.update_counter_id()
+
+            counter.items += 1
+            rows_since_flush += 1
+
+            if rows_since_flush >= self.flush_size:
+                book_prices_db.write_csv()
+                rows_since_flush = 0
+
+            counter.busy_time += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        book_prices_db.write_csv()
+        counter.busy_time += time.perf_counter() - start_time
+
+
+    async def feed(self, ids, id_queue):
+
+        for id in ids:
+            if self.book_prices_db.check_id_in_date(id, self.book_prices_db.date):
+                continue
+
+            await id_queue.put(id)
+
+        for _ in range(self.fetch_workers):
+            await id_queue.put(None)
+
+
+    async def crawl(self, ids, executor):
+
+        id_queue = asyncio.Queue(self.queue_size)
+        html_queue = asyncio.Queue(self.queue_size)
+        fields_queue = asyncio.Queue(self.queue_size)
+
+        fetchers = [asyncio.create_task(self.fetch_stage(id_queue, html_queue)) for _ in range(self.fetch_workers)]
+        parsers = [asyncio.create_task(self.parse_stage(html_queue, fields_queue, executor)) for _ in range(self.parse_workers)]
+        store = asyncio.create_task(self.store_stage(fields_queue))
+
+        closing = asyncio.create_task(self.close_stages(ids, fetchers, parsers, id_queue, html_queue, fields_queue))
+
+        # a failed writer would leave the parsers blocked on a full queue, the other stages are cancelled instead
+        await asyncio.wait([closing, store], return_when=asyncio.FIRST_EXCEPTION)
+
+        failed = [task for task in (store, closing) if task.done() and not task.cancelled() and task.exception()]
+
+        if failed:
+            for task in (closing, *fetchers, *parsers, store):
+                task.cancel()
+
+            await asyncio.gather(closing, *fetchers, *parsers, store, return_exceptions=True)
+
+            raise failed[0].exception()
+
+
+    async def close_stages(self, ids, fetchers, parsers, id_queue, html_queue, fields_queue):
+        """ Feed the ids and end each stage after the one before it, the end markers follow the last items """
+
+        await self.feed(ids, id_queue)
+        await asyncio.gather(*fetchers)
+
+        for _ in range(self.parse_workers):
+            await html_queue.put(None)
+
+        await asyncio.gather(*parsers)
+
+        await fields_queue.put(None)
+
+
+    def run(self, ids):
+        """ Crawl the given ids and print the counters of each stage """
+
+        start_time = time.perf_counter()
+
+        with ProcessPoolExecutor(self.parse_workers) as executor:
+            asyncio.run(self.crawl(ids, executor))
+
+        self.runtime = time.perf_counter() - start_time
+
+        for counter in self.counters.values():
+            counter.report(self.runtime)
@@ -0,0 +1,113 @@
+""" A class that can be used to choose which books are crawled on a given date and in which order """
+
+import numpy as np
+import pandas as pd
+
+from datetime import datetime
+
+
+class CrawlScheduler():
+    """ A class representing a crawl schedule from the price change history of each book """
+
+    def __init__(self, price_statistics, min_interval=1, max_interval=7, min_prices=7, deal_margin=0.05):
+
+        self.price_statistics = price_statistics
+
+        # days between two crawls of a book
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+        # books with fewer found prices are crawled every day until their change rate is known
+        self.min_prices = min_prices
+
+        # a price up to 5 % above the target or lowest price is close to a deal
+        self.deal_margin = deal_margin
+
+
+    def get_interval(self, id):
+        """ Get the days between two crawls: about one crawl per expected price change """
+
+        statistics = self.price_statistics.statistics
+
+        if id not in statistics or statistics[id][1] < self.min_prices:
+            return self.min_interval
+
+        change_rate = self.price_statistics.get_change_rate(id)
+
+        if pd.isna(change_rate):
+            return self.min_interval
+
+        if not change_rate:
+            return self.max_interval
+
+        return int(np.clip(np.floor(1 / change_rate), self.min_interval, self.max_interval))
+
+
+    def get_days_since_last_crawl(self, id, date):
+
+        if id not in self.price_statistics.statistics:
+            return np.inf
+
+        last_date = self.price_statistics.get_last_date(id)
+
+        if last_date is None:
+            return np.inf
+
+        return (datetime.strptime(date, '%Y-%m-%d') - datetime.strptime(last_date, '%Y-%m-%d')).days
+
+
+    def check_due(self, id, date):
+        """ Check if a book has to be crawled on a given date """
+
+        return self.get_days_since_last_crawl(id, date) >= self.get_interval(id)
+
+
+    def check_near_deal(self, id, target_price=None):
+        """ Check if the last price is close to the target price, or close to a lowest price the price moved away from """
+
+        if id not in self.price_statistics.statistics:
+            return False
+
+        last_price = self.price_statistics.get_last_price(id)
+
+        if pd.isna(last_price):
+            return False
+
+        limit = 1 + self.deal_margin
+        lowest_price = self.price_statistics.get_lowest(id)
+
+        # a price that never changed is always its lowest price, that is no deal
+        if self.price_statistics.get_changes(id) and not pd.isna(lowest_price) and last_price <= lowest_price * limit:
+            return True
+
+        if target_price is not None and not pd.isna(target_price) and last_price <= target_price * limit:
+            return True
+
+        return False
+
+
+    def get_priority(self, id, target_price=None):
+        """ Books close to a deal first, then books with frequent price changes """
+
+        change_rate = np.nan
+
+        if id in self.price_statistics.statistics:
+            change_rate = self.price_statistics.get_change_rate(id)
+
+        # new books are crawled early, their change rate is not known yet
+        if pd.isna(change_rate):
+            change_rate = 1
+
+        return (self.check_near_deal(id, target_price), change_rate)
+
+
+    def schedule(self, ids, date, target_prices=None):
+        """ Get the ids due on a given date, ordered by priority """
+
+        if target_prices is None:
+            target_prices = {}
+
+        # books not due have no row of the date, the deals report of the date does not show them
+        due_ids = [id for id in ids if self.check_due(id, date)]
+
+        return sorted(due_ids, key=lambda id: self.get_priority(id, target_prices.get(id)), reverse=True)
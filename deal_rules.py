@@ -0,0 +1,147 @@
+""" A class that can be used to evaluate deal rules on the prices of the last date """
+
+import json
+
+import numpy as np
+import pandas as pd
+
+
+# prices in cents, min_price is exclusive and max_price is inclusive
+# absolute_drop: price more than x cents below the average price
+# relative_drop: price more than x (fraction) below the average price
+# max_kindle_price: kindle price up to x cents
+default_deal_reports = [
+    {
+        'title': 'Percent from Difference from Average (0.10)',
+        'sort_by': 'diff_avg_price',
+        'highlight_lowest': True,
+        'rules': [
+            {'id': 'avg10pct', 'relative_drop': 0.10},
+        ],
+    },
+    {
+        'title': 'Kindle Price',
+        'sort_by': 'kindle_price',
+        'highlight_lowest': False,
+        'rules': [
+            {'id': 'kindle4', 'max_kindle_price': 399},
+        ],
+    },
+    {
+        'title': 'Difference from Average depending on Price',
+        'sort_by': None,
+        'highlight_lowest': True,
+        'rules': [
+            {'id': 'prices50', 'min_price': 5000, 'absolute_drop': 1000},
+            {'id': 'prices40', 'min_price': 3000, 'max_price': 4000, 'absolute_drop': 500},
+            {'id': 'prices30', 'min_price': 2000, 'max_price': 3000, 'absolute_drop': 500},
+            {'id': 'prices20', 'min_price': 1000, 'max_price': 2000, 'absolute_drop': 200},
+            {'id': 'prices10', 'max_price': 1000, 'absolute_drop': 100},
+        ],
+    },
+]
+
+rule_keys = {'id', 'min_price', 'max_price', 'absolute_drop', 'relative_drop', 'max_kindle_price'}
+
+
+def load_deal_reports(path):
+    """ Load deal reports and their rules from a json file """
+
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class DealRules():
+    """ A class representing deal rules compiled into one vectorized evaluation """
+
+    def __init__(self, deal_reports=None):
+
+        self.deal_reports = deal_reports or default_deal_reports
+
+        self.rules = [rule for report in self.deal_reports for rule in report['rules']]
+        self.rule_ids = np.array([rule['id'] for rule in self.rules])
+
+        self.check_rules()
+
+        # one bound per rule, nan if the rule has no condition on the column
+        self.min_price = self.get_bounds('min_price')
+        self.max_price = self.get_bounds('max_price')
+        self.max_diff_avg_price = -self.get_bounds('absolute_drop')
+        self.max_pct_diff_avg_price = -self.get_bounds('relative_drop')
+        self.max_kindle_price = self.get_bounds('max_kindle_price')
+
+
+    def check_rules(self):
+        """ Check that rule ids are unique and rules have known conditions """
+
+        if len(set(self.rule_ids)) != len(self.rule_ids):
+            raise ValueError('deal rule ids have to be unique')
+
+        for rule in self.rules:
+            unknown_keys = set(rule) - rule_keys
+
+            if unknown_keys:
+                raise ValueError(f'unknown conditions in deal rule {rule["id"]}: {sorted(unknown_keys)}')
+
+
+    def get_bounds(self, key):
+        """ Get an array with a bound per rule """
+
+        return np.array([rule.get(key, np.nan) for rule in self.rules], dtype='float64')
+
+
+    def match(self, df):
+        """ Get a boolean DataFrame (books x rules) with the rules matched by each book """
+
+        def get_column(column):
+            return df[column].to_numpy(dtype='float64', na_value=np.nan)[:, None]
+
+        price = get_column('price')
+        diff_avg_price = get_column('diff_avg_price')
+        kindle_price = get_column('kindle_price')
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct_diff_avg_price = diff_avg_price / get_column('average_price')
+
+        def check(values, bounds, compare):
+            # a rule without a bound on the column does not look at it
+            return np.isnan(bounds) | compare(values, bounds)
+
+        # every column is compared once against the bounds of all rules
+        matches = (
+            check(price, self.min_price, np.greater)
+            & check(price, self.max_price, np.less_equal)
+            & check(diff_avg_price, self.max_diff_avg_price, np.less)
+            & check(pct_diff_avg_price, self.max_pct_diff_avg_price, np.less)
+            & check(kindle_price, self.max_kindle_price, np.less_equal)
+        )
+
+        return pd.DataFrame(matches, index=df.index, columns=self.rule_ids)
+
+
+    def evaluate(self, df):
+        """ Get the id of the first rule matched by each book, only books matching a rule """
+
+        matches = self.match(df)
+        matched = matches.to_numpy().any(axis=1)
+        first_rule = matches.to_numpy().argmax(axis=1)
+
+        return pd.Series(self.rule_ids[first_rule[matched]], index=df.index[matched], name='deal_rule')
+
+
+    def get_reports(self, df):
+        """ Get (report, DataFrame of matching books) for each deal report """
+
+        matches = self.match(df)
+        reports = []
+
+        for report in self.deal_reports:
+            rule_ids = [rule['id'] for rule in report['rules']]
+            df_report = df[matches[rule_ids].to_numpy().any(axis=1)]
+
+            if report.get('sort_by'):
+                df_report = df_report.sort_values(report['sort_by'])
+
+            reports.append((report, df_report))
+
+        return reports
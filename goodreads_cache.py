@@ -0,0 +1,74 @@
+""" A class that can be used to cache book information from goodreads on disk """
+
+import json
+import os
+import sqlite3
+import time
+
+from contextlib import contextmanager
+
+
+class GoodreadsCache():
+    """ A class representing a persistent cache of goodreads ids and book information """
+
+    def __init__(self, cache_path='cache/goodreads.sqlite', ttl=30 * 24 * 60 * 60):
+
+        self.cache_path = cache_path
+
+        # seconds until an entry is requested again from goodreads
+        self.ttl = ttl
+
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+
+        with self.connect() as connection:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS ids (
+                    isbn TEXT PRIMARY KEY, goodreads_id TEXT, fetched_at REAL)''')
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS books (
+                    goodreads_id TEXT PRIMARY KEY, information TEXT, fetched_at REAL)''')
+
+
+    @contextmanager
+    def connect(self):
+        """ Connect to the cache, one connection per call so threads can share the cache """
+
+        connection = sqlite3.connect(self.cache_path, timeout=30)
+
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+
+    def get(self, isbn):
+        """ Get (goodreads id, book information) for an isbn, None if missing or expired """
+
+        oldest = time.time() - self.ttl
+
+        with self.connect() as connection:
+            row = connection.execute('''
+                SELECT ids.goodreads_id, books.information FROM ids
+                JOIN books ON ids.goodreads_id = books.goodreads_id
+                WHERE ids.isbn = ? AND ids.fetched_at >= ? AND books.fetched_at >= ?''',
+                (isbn, oldest, oldest)).fetchone()
+
+        if not row:
+            return None
+
+        goodreads_id, information = row
+
+        return goodreads_id, json.loads(information)
+
+
+    def put(self, isbn, goodreads_id, information):
+        """ Store the goodreads id and book information (dict) for an isbn """
+
+        now = time.time()
+
+        with self.connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO ids VALUES (?, ?, ?)', (isbn, goodreads_id, now))
+            connection.execute(
+                'INSERT OR REPLACE INTO books VALUES (?, ?, ?)',
+                (goodreads_id, json.dumps(information), now))
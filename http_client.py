@@ -0,0 +1,86 @@
+""" A class that can be used to share pooled keep-alive http sessions """
+
+import requests
+import time
+
+from importlib.util import find_spec
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+
+# urllib3 decodes brotli responses only when one of these packages is installed
+if find_spec('brotli') or find_spec('brotlicffi'):
+    accept_encoding = 'gzip, deflate, br'
+else:
+    accept_encoding = 'gzip, deflate'
+
+
+class HTTPClient():
+    """ A class representing a pooled http client shared by the crawlers """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, host_pool_sizes=None, timeout=30, metrics=None):
+
+        # number of kept-alive connections per host, e.g. {'www.amazon.de': 4}
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.host_pool_sizes = host_pool_sizes or {}
+        self.timeout = timeout
+
+        # CrawlMetrics recording latency, bytes and status of every request
+        self.metrics = metrics
+
+        self.session = requests.Session()
+        self.session.headers.update({'Accept-Encoding': accept_encoding})
+
+        self.mount_adapters()
+
+
+    def mount_adapters(self):
+        """ Mount connection pools, one per configured host """
+
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # requests uses the adapter with the longest matching prefix
+        for host, pool_size in self.host_pool_sizes.items():
+            host_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            self.session.mount(f'https://{host}/', host_adapter)
+            self.session.mount(f'http://{host}/', host_adapter)
+
+
+    def get(self, url, params=None, headers=None):
+        """ Send a GET request over a pooled connection """
+
+        start_time = time.perf_counter()
+
+        try:
+            response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            if self.metrics:
+                self.metrics.record_response(urlsplit(url).netloc, 'error', time.perf_counter() - start_time, 0)
+            raise
+
+        if self.metrics:
+            self.metrics.record_response(urlsplit(url).netloc, response.status_code, time.perf_counter() - start_time, len(response.content))
+
+        return response
+
+
+    def close(self):
+        """ Close all pooled connections """
+
+        self.session.close()
+
+
+default_http_client = None
+
+
+def get_default_http_client():
+    """ Get the http client shared by all pages of a run """
+
+    global default_http_client
+
+    if default_http_client is None:
+        default_http_client = HTTPClient(host_pool_sizes={'www.amazon.de': 4, 'www.goodreads.com': 2})
+
+    return default_http_client
@@ -0,0 +1,191 @@
+""" A class that can be used to share the ids of a crawl between worker processes """
+
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+
+from contextlib import contextmanager
+
+from crawl_journal import to_json
+
+
+def get_worker_name():
+    """ Get a name for the current process, unique across machines sharing the queue """
+
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class LeaseQueue():
+    """ A class representing a work queue in sqlite: ids are claimed with a lease and completed with a result """
+
+    def __init__(self, queue_path, lease_time=600, max_attempts=3):
+
+        self.queue_path = queue_path
+
+        # seconds a worker has to complete a claimed id before it is queued again
+        self.lease_time = lease_time
+
+        # an id failing more often is not queued again
+        self.max_attempts = max_attempts
+
+        # readers do not block the worker holding the write lock
+        connection = sqlite3.connect(self.queue_path, timeout=60)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.close()
+
+        with self.transaction() as connection:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS tasks (
+                    date TEXT, id TEXT, status TEXT, worker TEXT, lease_expires_at REAL,
+                    attempts INTEGER DEFAULT 0, result TEXT, lease TEXT,
+                    PRIMARY KEY (date, id))''')
+            connection.execute('CREATE INDEX IF NOT EXISTS tasks_status ON tasks (date, status)')
+
+            # queues created before leases had tokens
+            columns = [row[1] for row in connection.execute('PRAGMA table_info(tasks)')]
+
+            if 'lease' not in columns:
+                connection.execute('ALTER TABLE tasks ADD COLUMN lease TEXT')
+
+
+    @contextmanager
+    def transaction(self):
+        """ Connect and lock the queue for writing, each block is one transaction """
+
+        # autocommit mode, so the write lock is taken when the transaction begins
+        connection = sqlite3.connect(self.queue_path, timeout=60, isolation_level=None)
+
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+
+            connection.execute('COMMIT')
+
+        finally:
+            connection.close()
+
+
+    def enqueue(self, ids, date):
+        """ Add the ids of a date, ids already queued, claimed or done are kept as they are """
+
+        with self.transaction() as connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO tasks (date, id, status) VALUES (?, ?, 'queued')",
+                [(date, id) for id in ids])
+
+
+    def requeue_expired_leases(self, connection, date):
+        """ Queue again the ids of workers that did not complete them in time, e.g. after a crash """
+
+        connection.execute(
+            "UPDATE tasks SET status = 'queued', worker = NULL, lease_expires_at = NULL, lease = NULL, attempts = attempts + 1 "
+            "WHERE date = ? AND status = 'leased' AND lease_expires_at < ?",
+            (date, time.time()))
+
+        # results of a worker that crashed while storing them are collected again
+        connection.execute(
+            "UPDATE tasks SET status = 'done', worker = NULL, lease_expires_at = NULL "
+            "WHERE date = ? AND status = 'storing' AND lease_expires_at < ?",
+            (date, time.time()))
+
+        connection.execute(
+            "UPDATE tasks SET status = 'failed' WHERE date = ? AND status = 'queued' AND attempts >= ?",
+            (date, self.max_attempts))
+
+
+    def claim(self, worker, date, count=1):
+        """ Lease up to count queued ids of a date to a worker, get (id, lease token) pairs """
+
+        with self.transaction() as connection:
+            self.requeue_expired_leases(connection, date)
+
+            ids = [row[0] for row in connection.execute(
+                "SELECT id FROM tasks WHERE date = ? AND status = 'queued' ORDER BY rowid LIMIT ?",
+                (date, count))]
+
+            # a new token per lease, a worker whose lease expired cannot report for the next one
+            leases = [(id, uuid.uuid4().hex) for id in ids]
+
+            connection.executemany(
+                "UPDATE tasks SET status = 'leased', worker = ?, lease_expires_at = ?, lease = ? WHERE date = ? AND id = ?",
+                [(worker, time.time() + self.lease_time, lease, date, id) for id, lease in leases])
+
+        return leases
+
+
+    def complete(self, id, date, lease, result):
+        """ Report the result of a claimed id, a result reported after the lease expired is dropped """
+
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET status = 'done', lease_expires_at = NULL, lease = NULL, result = ? "
+                "WHERE date = ? AND id = ? AND status = 'leased' AND lease = ?",
+                (json.dumps(result, default=to_json, ensure_ascii=False), date, id, lease))
+
+            return cursor.rowcount == 1
+
+
+    def fail(self, id, date, lease):
+        """ Give back a claimed id, it is queued again until it reached the maximum number of attempts """
+
+        with self.transaction() as connection:
+            connection.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'queued' END, "
+                "worker = NULL, lease_expires_at = NULL, lease = NULL, attempts = attempts + 1 "
+                "WHERE date = ? AND id = ? AND status = 'leased' AND lease = ?",
+                (self.max_attempts, date, id, lease))
+
+
+    def collect(self, date, store, worker=None):
+        """ Pass the results of completed ids to store() and mark them as stored, only if store() succeeds """
+
+        # the results are taken out of the queue with the lock, the lock is not held while storing
+        with self.transaction() as connection:
+            self.requeue_expired_leases(connection, date)
+
+            rows = connection.execute(
+                "SELECT id, result FROM tasks WHERE date = ? AND status = 'done' ORDER BY rowid",
+                (date,)).fetchall()
+
+            connection.executemany(
+                "UPDATE tasks SET status = 'storing', worker = ?, lease_expires_at = ? WHERE date = ? AND id = ?",
+                [(worker, time.time() + self.lease_time, date, id) for id, result in rows])
+
+        if not rows:
+            return 0
+
+        try:
+            store([json.loads(result) for id, result in rows])
+        except BaseException:
+            # given back to be collected again
+            with self.transaction() as connection:
+                connection.executemany(
+                    "UPDATE tasks SET status = 'done', worker = NULL, lease_expires_at = NULL WHERE date = ? AND id = ? AND status = 'storing'",
+                    [(date, id) for id, result in rows])
+
+            raise
+
+        # only a worker crashing between store() and this update leaves results to be stored again
+        with self.transaction() as connection:
+            connection.executemany(
+                "UPDATE tasks SET status = 'stored', result = NULL, lease_expires_at = NULL WHERE date = ? AND id = ?",
+                [(date, id) for id, result in rows])
+
+        return len(rows)
+
+
+    def count(self, date):
+        """ Get the number of ids per status for a date """
+
+        with self.transaction() as connection:
+            rows = connection.execute('SELECT status, COUNT(*) FROM tasks WHERE date = ? GROUP BY status', (date,))
+
+            return dict(rows.fetchall())
@@ -0,0 +1,79 @@
+""" A class that can be used to describe an amazon storefront: domain, texts of the page and price format """
+
+import os
+import re
+
+
+class Marketplace():
+    """ A class representing an amazon marketplace """
+
+    def __init__(self, name, domain, shipped_by_amazon, kindle_format, currency, decimal_separator=',',
+                 thousands_separators='.', requests_per_second=None):
+
+        self.name = name
+        self.domain = domain
+
+        # texts of the merchant info if amazon ships the item, one of them has to be found
+        self.shipped_by_amazon = shipped_by_amazon
+
+        # name of the Kindle edition in the formats block of a product page
+        self.kindle_format = kindle_format
+
+        # prices of the marketplace are stored in cents of its currency
+        self.currency = currency
+
+        # e.g. '1.234,56' on amazon.de and '1,234.56' on amazon.co.uk
+        self.price_pattern = re.compile(
+            rf'(\d{{1,3}}(?:[{re.escape(thousands_separators)}]\d{{3}})+|\d+){re.escape(decimal_separator)}(\d{{2}})'
+        )
+
+        # None: the request rate of the database
+        self.requests_per_second = requests_per_second
+
+
+    def get_product_url(self, id):
+
+        return f'https://{self.domain}/dp/{id}'
+
+
+    def get_price_from_text(self, text):
+        """ Get a price from a text like 'EUR 1.234,56' in the format of the marketplace """
+
+        match = self.price_pattern.search(text)
+
+        if not match:
+            return None
+
+        units, cents = match.groups()
+
+        return float(f'{re.sub(r"[^0-9]", "", units)}.{cents}')
+
+
+    def check_shipped_by_amazon(self, seller_infos):
+
+        return any(text in seller_infos for text in self.shipped_by_amazon)
+
+
+marketplaces = {
+    'de': Marketplace('de', 'www.amazon.de', ('Versand durch Amazon',), 'Kindle', 'EUR'),
+    'fr': Marketplace('fr', 'www.amazon.fr', ('Expédié par Amazon',), 'Format Kindle', 'EUR', thousands_separators=' \u00a0\u202f.'),
+    'it': Marketplace('it', 'www.amazon.it', ('Spedito da Amazon',), 'Formato Kindle', 'EUR'),
+    'es': Marketplace('es', 'www.amazon.es', ('Enviado por Amazon',), 'Versión Kindle', 'EUR'),
+    'uk': Marketplace('uk', 'www.amazon.co.uk', ('Dispatched from Amazon', 'Dispatched from and sold by Amazon', 'Fulfilled by Amazon'),
+                      'Kindle Edition', 'GBP', decimal_separator='.', thousands_separators=','),
+    'com': Marketplace('com', 'www.amazon.com', ('Ships from Amazon', 'Ships from and sold by Amazon', 'Fulfilled by Amazon'),
+                       'Kindle', 'USD', decimal_separator='.', thousands_separators=','),
+}
+
+default_marketplace = marketplaces['de']
+
+
+def get_marketplace_path(path, marketplace):
+    """ Get the path of a table or log file of a marketplace, the default marketplace keeps the given path """
+
+    if marketplace is default_marketplace:
+        return path
+
+    base, extension = os.path.splitext(path)
+
+    return f'{base}_{marketplace.name}{extension}'
@@ -0,0 +1,50 @@
+""" A class that can be used to crawl the books of a database on several amazon marketplaces at once """
+
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from book_prices_db import BookPricesDatabase
+from marketplace import marketplaces
+
+
+class MarketplaceCrawl():
+    """ A class representing one price database per marketplace, crawled concurrently """
+
+    def __init__(self, db_infos, marketplace_names=('de',)):
+
+        # each database has its own rate limiter, connection pool, page cache and price table
+        self.book_prices_dbs = {
+            name: BookPricesDatabase(db_infos, marketplace=marketplaces[name]) for name in marketplace_names
+        }
+
+        # marketplace name -> seconds of its run
+        self.runtimes = {}
+
+
+    def run_marketplace(self, name):
+
+        start_time = time.time()
+
+        try:
+            self.book_prices_dbs[name].run()
+        finally:
+            self.runtimes[name] = time.time() - start_time
+
+
+    def run(self):
+        """ Crawl all marketplaces at the same time, the runtime is the one of the slowest marketplace """
+
+        start_time = time.time()
+
+        # the crawls wait on their own rate limiter and the network, one thread per marketplace is enough
+        with ThreadPoolExecutor(len(self.book_prices_dbs)) as executor:
+            futures = {name: executor.submit(self.run_marketplace, name) for name in self.book_prices_dbs}
+
+        for name, future in futures.items():
+            if future.exception():
+                print(f'crawl of marketplace {name} failed: {future.exception()}')
+
+            print(f'marketplace {name}: {self.runtimes.get(name, 0):.0f} s')
+
+        print(f'runtime of all marketplaces: {time.time() - start_time:.0f} s')
@@ -0,0 +1,192 @@
+""" A class that can be used to cache raw product pages on disk """
+
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+
+from contextlib import contextmanager
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class PageCache():
+    """ A class representing a compressed, content-addressed cache of product pages """
+
+    def __init__(self, cache_dir='cache/pages', ttl=7 * 24 * 60 * 60, max_size=1024 ** 3):
+
+        self.cache_dir = cache_dir
+        self.blobs_dir = os.path.join(cache_dir, 'blobs')
+        self.index_path = os.path.join(cache_dir, 'index.sqlite')
+
+        # seconds a page is served from the cache and maximum size of all blobs in bytes
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self.compression = 'zstd' if zstandard else 'gzip'
+
+        os.makedirs(self.blobs_dir, exist_ok=True)
+
+        with self.connect() as connection:
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS pages (
+                    id TEXT, date TEXT, digest TEXT, fetched_at REAL, accessed_at REAL,
+                    PRIMARY KEY (id, date))''')
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS blobs (
+                    digest TEXT PRIMARY KEY, compression TEXT, size INTEGER)''')
+            connection.execute('CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)')
+
+
+    @contextmanager
+    def connect(self):
+        """ Connect to the index, one connection per call so threads and processes can share the cache """
+
+        connection = sqlite3.connect(self.index_path, timeout=30)
+
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+
+    def get_blob_path(self, digest, compression):
+        """ Get the path of a blob, grouped in directories by the first two hex digits """
+
+        extension = 'zst' if compression == 'zstd' else 'gz'
+
+        return os.path.join(self.blobs_dir, digest[:2], f'{digest}.html.{extension}')
+
+
+    def compress(self, data):
+
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor(level=10).compress(data)
+
+        return gzip.compress(data, compresslevel=6)
+
+
+    def decompress(self, data, compression):
+
+        if compression == 'zstd':
+            if not zstandard:
+                return None
+
+            return zstandard.ZstdDecompressor().decompress(data)
+
+        return gzip.decompress(data)
+
+
+    def get(self, id, date):
+        """ Get the html of a page fetched for an id at a given date """
+
+        with self.connect() as connection:
+            row = connection.execute('''
+                SELECT pages.digest, pages.fetched_at, blobs.compression FROM pages
+                JOIN blobs ON pages.digest = blobs.digest
+                WHERE pages.id = ? AND pages.date = ?''', (id, date)).fetchone()
+
+            if not row:
+                return None
+
+            digest, fetched_at, compression = row
+
+            if time.time() - fetched_at > self.ttl:
+                connection.execute('DELETE FROM pages WHERE id = ? AND date = ?', (id, date))
+                return None
+
+            connection.execute('UPDATE pages SET accessed_at = ? WHERE id = ? AND date = ?', (time.time(), id, date))
+
+        try:
+            with open(self.get_blob_path(digest, compression), 'rb') as f:
+                data = self.decompress(f.read(), compression)
+        except FileNotFoundError:
+            return None
+
+        if data is None:
+            return None
+
+        return data.decode('utf-8')
+
+
+    def put(self, id, date, html):
+        """ Store the html of a page fetched for an id at a given date """
+
+        data = html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self.get_blob_path(digest, self.compression)
+
+        with self.connect() as connection:
+            known = connection.execute('SELECT 1 FROM blobs WHERE digest = ?', (digest,)).fetchone()
+
+            # identical pages are stored only once
+            if not known:
+                compressed = self.compress(data)
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+
+                # write to a temporary file first, so a crash never leaves a truncated blob
+                # a unique name per call, threads of a process may store the same page at once
+                file_descriptor, temporary_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(blob_path))
+
+                with os.fdopen(file_descriptor, 'wb') as f:
+                    f.write(compressed)
+
+                os.replace(temporary_path, blob_path)
+
+                connection.execute(
+                    'INSERT OR REPLACE INTO blobs VALUES (?, ?, ?)',
+                    (digest, self.compression, len(compressed)))
+
+            now = time.time()
+            connection.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)', (id, date, digest, now, now))
+
+        self.evict()
+
+
+    def evict(self):
+        """ Remove expired pages and the least recently used pages above the size cap """
+
+        with self.connect() as connection:
+            connection.execute('DELETE FROM pages WHERE fetched_at < ?', (time.time() - self.ttl,))
+
+            total_size = connection.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+
+            if total_size > self.max_size:
+                pages = connection.execute('''
+                    SELECT pages.id, pages.date, pages.digest, blobs.size FROM pages
+                    JOIN blobs ON pages.digest = blobs.digest
+                    ORDER BY pages.accessed_at''').fetchall()
+
+                # a blob is freed when its last page is removed
+                references = {}
+
+                for id, date, digest, size in pages:
+                    references[digest] = references.get(digest, 0) + 1
+
+                for id, date, digest, size in pages:
+                    if total_size <= self.max_size:
+                        break
+
+                    connection.execute('DELETE FROM pages WHERE id = ? AND date = ?', (id, date))
+                    references[digest] -= 1
+
+                    if not references[digest]:
+                        total_size -= size
+
+            unreferenced = connection.execute('''
+                SELECT digest, compression FROM blobs
+                WHERE digest NOT IN (SELECT digest FROM pages)''').fetchall()
+
+            for digest, compression in unreferenced:
+                try:
+                    os.remove(self.get_blob_path(digest, compression))
+                except FileNotFoundError:
+                    pass
+
+                connection.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
@@ -0,0 +1,235 @@
+""" A class that can be used to keep running price statistics per book """
+
+import json
+import math
+import os
+import tempfile
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from collections import deque
+
+
+class PriceStatistics():
+    """ A class representing running price statistics per id, updated in O(1) per new price """
+
+    # prices and statistics are integer cents
+    unit = 'cents'
+
+    # layout of the statistics per id, files of an older layout are rebuilt
+    version = 3
+
+    def __init__(self, statistics_path, window=7):
+
+        self.statistics_path = statistics_path
+
+        # number of entries for the average of the last week
+        self.window = window
+
+        # id -> [sum of prices, number of prices, lowest price, last entries (None if no price),
+        #        number of price changes, last price found, last date crawled, first date crawled]
+        self.statistics = {}
+
+        # number of rows of the price table the statistics were calculated from
+        self.rows = 0
+
+
+    def build(self, prices):
+        """ Build statistics from a price Series indexed by (date, id), in one pass per aggregate """
+
+        prices = pd.to_numeric(prices, errors='coerce')
+        grouped = prices.groupby(level='id', sort=False)
+
+        sums = grouped.sum()
+        counts = grouped.count()
+        lowest = grouped.min()
+        recent = grouped.tail(self.window).groupby(level='id', sort=False).agg(list)
+
+        # a change is a found price different from the price found before, entries without a price are skipped
+        found_prices = prices.dropna()
+        previous_prices = found_prices.groupby(level='id', sort=False).shift()
+        changes = ((found_prices != previous_prices) & previous_prices.notna()).groupby(level='id', sort=False).sum()
+        last_prices = found_prices.groupby(level='id', sort=False).last()
+
+        last_dates = pd.Series(prices.index.get_level_values('date'), index=prices.index.get_level_values('id'))
+        first_dates = last_dates.groupby(level='id', sort=False).first()
+        last_dates = last_dates.groupby(level='id', sort=False).last()
+
+        self.statistics = {}
+
+        for id in counts.index:
+            self.statistics[id] = [
+                float(sums[id]),
+                int(counts[id]),
+                None if pd.isna(lowest[id]) else float(lowest[id]),
+                deque((None if pd.isna(price) else float(price) for price in recent[id]), maxlen=self.window),
+                int(changes.get(id, 0)),
+                None if id not in last_prices.index else float(last_prices[id]),
+                last_dates[id],
+                first_dates[id],
+            ]
+
+        self.rows = len(prices)
+
+
+    def load(self, rows, price_total):
+        """ Load statistics from disk if they match a price table with a given number of rows and sum of prices """
+
+        if not os.path.exists(self.statistics_path):
+            return False
+
+        with open(self.statistics_path, encoding='utf-8') as f:
+            data = json.load(f)
+
+        if data['rows'] != rows or data['window'] != self.window or data.get('unit') != self.unit or data.get('version') != self.version:
+            return False
+
+        # a price replaced in place or a deleted and crawled again row keeps the number of rows, not the sum
+        if round(sum(total for total, *_ in data['statistics'].values())) != price_total:
+            return False
+
+        self.statistics = {
+            id: [total, count, lowest, deque(recent, maxlen=self.window), changes, last_price, last_date, first_date]
+            for id, (total, count, lowest, recent, changes, last_price, last_date, first_date) in data['statistics'].items()
+        }
+        self.rows = rows
+
+        return True
+
+
+    def save(self):
+        """ Write statistics next to the price table """
+
+        data = {
+            'rows': self.rows,
+            'window': self.window,
+            'unit': self.unit,
+            'version': self.version,
+            'statistics': {
+                id: [total, count, lowest, list(recent), changes, last_price, last_date, first_date]
+                for id, (total, count, lowest, recent, changes, last_price, last_date, first_date) in self.statistics.items()
+            },
+        }
+
+        # a unique name per call, the workers of a lease queue save the same file
+        file_descriptor, temporary_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(self.statistics_path) or '.')
+
+        with os.fdopen(file_descriptor, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+        os.replace(temporary_path, self.statistics_path)
+
+
+    def update(self, id, price, date=None):
+        """ Add a new price (None if not found) crawled on a given date for a given id """
+
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            price = None
+
+        if price is not None and math.isnan(price):
+            price = None
+
+        if id not in self.statistics:
+            self.statistics[id] = [0.0, 0, None, deque(maxlen=self.window), 0, None, None, None]
+
+        statistics = self.statistics[id]
+
+        if price is not None:
+            statistics[0] += price
+            statistics[1] += 1
+
+            if statistics[2] is None or price < statistics[2]:
+                statistics[2] = price
+
+            if statistics[5] is not None and price != statistics[5]:
+                statistics[4] += 1
+
+            statistics[5] = price
+
+        statistics[3].append(price)
+
+        if date is not None:
+            statistics[6] = date
+
+            if statistics[7] is None:
+                statistics[7] = date
+
+        self.rows += 1
+
+
+    def get_average(self, id):
+        """ Get the price average over time """
+
+        total, count = self.statistics[id][:2]
+
+        if not count:
+            return np.nan
+
+        return int(np.round(total / count))
+
+
+    def get_average_last_week(self, id):
+        """ Get the price average of the last entries """
+
+        count, recent = self.statistics[id][1], self.statistics[id][3]
+        prices = [price for price in recent if price is not None]
+
+        if not count or not prices:
+            return np.nan
+
+        return int(np.round(sum(prices) / len(prices)))
+
+
+    def get_lowest(self, id):
+        """ Get the lowest price """
+
+        lowest = self.statistics[id][2]
+
+        if lowest is None:
+            return np.nan
+
+        return int(lowest)
+
+
+    def get_changes(self, id):
+        """ Get the number of found prices that differ from the price found before """
+
+        return self.statistics[id][4]
+
+
+    def get_change_rate(self, id):
+        """ Get the price changes per day since the first crawl, independent of how often the id is crawled """
+
+        count, changes, last_date, first_date = self.statistics[id][1], self.statistics[id][4], *self.statistics[id][6:8]
+
+        if count < 2 or last_date is None or first_date is None:
+            return np.nan
+
+        days = (datetime.strptime(last_date, '%Y-%m-%d') - datetime.strptime(first_date, '%Y-%m-%d')).days
+
+        if days < 1:
+            return np.nan
+
+        return changes / days
+
+
+    def get_last_price(self, id):
+        """ Get the last price found """
+
+        last_price = self.statistics[id][5]
+
+        if last_price is None:
+            return np.nan
+
+        return int(last_price)
+
+
+    def get_last_date(self, id):
+        """ Get the last date the id was crawled """
+
+        return self.statistics[id][6]
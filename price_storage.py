@@ -0,0 +1,539 @@
+""" Classes that can be used to store the tables of the databases, indexed by (date, id) or id """
+
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+
+import pandas as pd
+
+from contextlib import contextmanager
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from schema import apply_schema, price_columns, remove_categories, to_text
+
+
+class PriceStorage():
+    """ A class representing the common interface of the table backends """
+
+    # True if the backend answers point lookups and day slices without loading the table
+    indexed = False
+
+    def __init__(self, path, index=None):
+
+        self.path = path
+        self.index = index or ['date', 'id']
+
+        # text repeated on every date becomes categorical, the book table has one row per id
+        self.categories = 'date' in self.index
+
+
+    def load(self, columns=None, dates=None):
+        """ Load a DataFrame indexed by (date, id), optionally only some columns and dates """
+
+        raise NotImplementedError
+
+
+    def write(self, df):
+        """ Write the full DataFrame """
+
+        raise NotImplementedError
+
+
+    def append(self, df):
+        """ Add new rows to the stored table """
+
+        raise NotImplementedError
+
+
+    def load_last_date(self, columns=None):
+        """ Load only the rows of the latest stored date """
+
+        df = self.load(columns=columns)
+
+        if not len(df):
+            return df
+
+        last_date = df.index.get_level_values('date')[-1]
+
+        return df.loc[last_date : last_date]
+
+
+    def upgrade(self):
+        """ Rewrite the stored table in the typed format, e.g. prices stored as text in euros """
+
+        self.write(self.load())
+
+
+    def import_csv(self, csv_path):
+        """ Replace the stored table with the content of a csv file """
+
+        self.write(CSVStorage(csv_path).load())
+
+
+    def export_csv(self, csv_path):
+        """ Write the stored table as a csv file """
+
+        CSVStorage(csv_path).write(self.load())
+
+
+class CSVStorage(PriceStorage):
+    """ A class representing a price table stored in a single csv file """
+
+    def load(self, columns=None, dates=None):
+
+        usecols = None if columns is None else self.index + list(columns)
+
+        # e.g. the table of a marketplace that was not crawled before
+        if not os.path.exists(self.path):
+            df = pd.DataFrame(columns=self.index + list(columns or [])).set_index(self.index)
+
+            return apply_schema(df, prices_in_cents=True, categories=self.categories)
+
+        df = pd.read_csv(self.path, header=0, dtype='str', usecols=usecols)
+
+        if dates is not None and 'date' in self.index:
+            df = df[df['date'].isin(dates)]
+
+        # csv files keep prices in euros, in memory they are integer cents
+        return apply_schema(df.set_index(self.index), categories=self.categories)
+
+
+    def load_last_date(self, columns=None, block_size=1 << 20):
+        """ Load the rows of the latest date from the end of the file, rows are appended in date order """
+
+        if not os.path.exists(self.path) or 'date' not in self.index:
+            return super().load_last_date(columns)
+
+        with open(self.path, 'rb') as f:
+            header = f.readline()
+
+            # the date is the first field of each row
+            if not header.startswith(b'date,'):
+                return super().load_last_date(columns)
+
+            start = len(header)
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            rows = None
+
+            # read blocks backwards until a row of an earlier date shows up
+            while position > start:
+                position = max(start, position - block_size)
+                f.seek(position)
+                tail = f.read(end - position)
+
+                lines = tail.splitlines()
+
+                # the first line of a block can be a partial row
+                complete_lines = lines if position == start else lines[1:]
+                complete_lines = [line for line in complete_lines if line]
+
+                if not complete_lines:
+                    continue
+
+                last_date = complete_lines[-1].split(b',', 1)[0]
+                earlier_rows = [i for i, line in enumerate(complete_lines) if not line.startswith(last_date + b',')]
+
+                if earlier_rows:
+                    rows = complete_lines[earlier_rows[-1] + 1:]
+                    break
+
+                if position == start:
+                    rows = complete_lines
+
+        if not rows:
+            return super().load_last_date(columns)
+
+        usecols = None if columns is None else self.index + list(columns)
+        text = io.BytesIO(header + b'\n'.join(rows) + b'\n')
+
+        df = pd.read_csv(text, header=0, dtype='str', usecols=usecols, encoding='utf-8')
+
+        return apply_schema(df.set_index(self.index), categories=self.categories)
+
+
+    def write(self, df):
+
+        to_text(df).to_csv(self.path)
+
+
+    def append(self, df):
+
+        header = not os.path.exists(self.path)
+
+        # the batch is on disk before the next one is crawled
+        with open(self.path, 'a', encoding='utf-8', newline='') as f:
+            to_text(df).to_csv(f, header=header)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class ParquetStorage(PriceStorage):
+    """ A class representing a price table stored as parquet files partitioned by date """
+
+    def get_dates(self):
+        """ Get the stored dates from the partition directories """
+
+        if not os.path.isdir(self.path):
+            return []
+
+        prefix = 'date='
+
+        return sorted(name[len(prefix):] for name in os.listdir(self.path) if name.startswith(prefix))
+
+
+    def load(self, columns=None, dates=None):
+
+        if dates is not None:
+            dates = [date for date in dates if date in self.get_dates()]
+
+        if not self.get_dates() or dates == []:
+            df = pd.DataFrame(columns=self.index + list(columns or [])).set_index(self.index)
+
+            return apply_schema(df, prices_in_cents=True, categories=self.categories)
+
+        # only the partitions of the requested dates are read
+        filters = None if dates is None else [('date', 'in', list(dates))]
+        read_columns = None if columns is None else self.index + list(columns)
+
+        df = pd.read_parquet(self.path, columns=read_columns, filters=filters)
+
+        # the partition column is read back as a categorical
+        df['date'] = df['date'].astype(str)
+
+        df = df.set_index(self.index)[[column for column in df.columns if column not in self.index]]
+
+        # integer price columns are cents, partitions written as text before are still in euros
+        df = apply_schema(df, categories=self.categories)
+
+        return df.sort_index(level='date', sort_remaining=False)
+
+
+    def load_last_date(self, columns=None):
+
+        # a single partition directory is read
+        return self.load(columns=columns, dates=self.get_dates()[-1:])
+
+
+    def get_files(self):
+        """ Get the parquet files of the dataset in the order they are discovered when it is read """
+
+        files = []
+
+        for root, directories, names in os.walk(self.path):
+            directories.sort()
+            files.extend(os.path.join(root, name) for name in sorted(names) if not name.startswith(('.', '_')))
+
+        return files
+
+
+    def prices_in_cents(self):
+        """ Check if the prices are stored as integer cents, datasets written as text keep euros """
+
+        files = self.get_files()
+
+        if not files:
+            return True
+
+        # the dataset is read with the schema of its first file
+        schema = pyarrow.parquet.read_schema(files[0])
+
+        return all(pyarrow.types.is_integer(schema.field(column).type) for column in price_columns if column in schema.names)
+
+
+    def write(self, df):
+
+        # written next to the dataset first, a failed write keeps the stored table
+        directory, name = os.path.split(os.path.abspath(self.path))
+        temporary_path = tempfile.mkdtemp(prefix=f'{name}.', suffix='.tmp', dir=directory)
+
+        try:
+            remove_categories(df).reset_index().to_parquet(temporary_path, partition_cols=['date'], index=False)
+        except BaseException:
+            shutil.rmtree(temporary_path, ignore_errors=True)
+            raise
+
+        if not os.path.isdir(self.path):
+            os.replace(temporary_path, self.path)
+            return None
+
+        # the old dataset is only removed once the new one is in place, a crash in between leaves it as .old
+        old_path = f'{temporary_path}.old'
+        os.replace(self.path, old_path)
+        os.replace(temporary_path, self.path)
+        shutil.rmtree(old_path)
+
+
+    def append(self, df):
+
+        # datasets written before the typed schema keep prices in euros until upgrade()
+        if not self.prices_in_cents():
+            df = to_text(df)
+
+        # a new file per call in each date partition, existing files are not rewritten
+        # categoricals as plain strings, so every file of the dataset has the same schema
+        remove_categories(df).reset_index().to_parquet(self.path, partition_cols=['date'], index=False)
+
+
+class SQLiteStorage(PriceStorage):
+    """ A class representing a table stored in sqlite with indexes on (date, id) and id """
+
+    indexed = True
+
+    def __init__(self, path, index=None, table='entries'):
+
+        super().__init__(path, index)
+        self.table = table
+
+
+    @contextmanager
+    def connect(self):
+        """ Connect to the database, each block is one transaction """
+
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA synchronous=NORMAL')
+
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+
+    def get_columns(self, connection):
+        """ Get the stored columns without the index """
+
+        rows = connection.execute(f'PRAGMA table_info("{self.table}")').fetchall()
+
+        return [row[1] for row in rows if row[1] not in self.index]
+
+
+    def get_column_type(self, column):
+
+        return 'INTEGER' if column in price_columns else 'TEXT'
+
+
+    def prices_in_cents(self, connection):
+        """ Check if the prices are stored as integer cents, tables created as text keep euros """
+
+        rows = connection.execute(f'PRAGMA table_info("{self.table}")').fetchall()
+
+        return all(row[2] == 'INTEGER' for row in rows if row[1] in price_columns)
+
+
+    def create_table(self, connection, columns):
+
+        definitions = ', '.join(f'"{column}" {self.get_column_type(column)}' for column in self.index + list(columns))
+        primary_key = ', '.join(f'"{column}"' for column in self.index)
+
+        # the primary key is the (date, id) index, ids get an index of their own
+        connection.execute(f'CREATE TABLE IF NOT EXISTS "{self.table}" ({definitions}, PRIMARY KEY ({primary_key}))')
+
+        if len(self.index) > 1:
+            connection.execute(f'CREATE INDEX IF NOT EXISTS "{self.table}_id" ON "{self.table}" (id)')
+
+        connection.execute('PRAGMA journal_mode=WAL')
+
+
+    def load(self, columns=None, dates=None):
+
+        with self.connect() as connection:
+            stored_columns = self.get_columns(connection)
+
+            prices_in_cents = self.prices_in_cents(connection)
+
+            if not stored_columns or (dates is not None and not len(dates)):
+                df = pd.DataFrame(columns=self.index + list(columns or stored_columns)).set_index(self.index)
+
+                return apply_schema(df, prices_in_cents=True, categories=self.categories)
+
+            selected = self.index + [column for column in (columns or stored_columns) if column not in self.index]
+            quoted_columns = ', '.join(f'"{column}"' for column in selected)
+            query = f'SELECT {quoted_columns} FROM "{self.table}"'
+            params = []
+
+            if dates is not None:
+                query += f' WHERE date IN ({", ".join("?" * len(dates))})'
+                params = list(dates)
+
+            # rowid keeps the order in which the rows were added
+            df = pd.read_sql_query(f'{query} ORDER BY rowid', connection, params=params)
+
+        return apply_schema(df.set_index(self.index), prices_in_cents=prices_in_cents, categories=self.categories)
+
+
+    def get_rows(self, df):
+        """ Get rows as tuples, missing values as NULL """
+
+        df = df.reset_index().astype(object)
+
+        return list(df.where(df.notna(), None).itertuples(index=False, name=None)), list(df.columns)
+
+
+    def insert(self, connection, df):
+        """ Bulk insert rows in the current transaction """
+
+        rows, columns = self.get_rows(df)
+        quoted_columns = ', '.join(f'"{column}"' for column in columns)
+        placeholders = ', '.join('?' * len(columns))
+
+        connection.executemany(f'INSERT OR REPLACE INTO "{self.table}" ({quoted_columns}) VALUES ({placeholders})', rows)
+
+
+    def write(self, df):
+
+        with self.connect() as connection:
+            connection.execute(f'DROP TABLE IF EXISTS "{self.table}"')
+            self.create_table(connection, df.columns)
+            self.insert(connection, df)
+
+
+    def append(self, df):
+
+        with self.connect() as connection:
+            # tables created before the typed schema keep prices in euros until upgrade()
+            if self.get_columns(connection) and not self.prices_in_cents(connection):
+                df = to_text(df)
+
+            self.create_table(connection, df.columns)
+            self.insert(connection, df)
+
+
+    def count(self):
+        """ Get the number of stored rows """
+
+        with self.connect() as connection:
+            if not self.get_columns(connection):
+                return 0
+
+            return connection.execute(f'SELECT COUNT(*) FROM "{self.table}"').fetchone()[0]
+
+
+    def get_price_total(self):
+        """ Get the sum of the stored prices in cents """
+
+        with self.connect() as connection:
+            if 'price' not in self.get_columns(connection):
+                return 0
+
+            # tables created before the typed schema keep prices in euros
+            if self.prices_in_cents(connection):
+                query = f'SELECT SUM(price) FROM "{self.table}"'
+            else:
+                query = f'SELECT SUM(ROUND(CAST(price AS REAL) * 100)) FROM "{self.table}" WHERE price IS NOT NULL AND price != \'\''
+
+            return int(connection.execute(query).fetchone()[0] or 0)
+
+
+    def get_dates(self):
+        """ Get the stored dates in order """
+
+        with self.connect() as connection:
+            if not self.get_columns(connection):
+                return []
+
+            return [row[0] for row in connection.execute(f'SELECT DISTINCT date FROM "{self.table}" ORDER BY date')]
+
+
+    def get_ids(self):
+        """ Get the stored ids """
+
+        with self.connect() as connection:
+            if not self.get_columns(connection):
+                return []
+
+            return [row[0] for row in connection.execute(f'SELECT DISTINCT id FROM "{self.table}"')]
+
+
+    def get_last_date(self):
+        """ Get the latest stored date """
+
+        with self.connect() as connection:
+            if not self.get_columns(connection):
+                return None
+
+            # answered from the (date, id) primary key index
+            return connection.execute(f'SELECT MAX(date) FROM "{self.table}"').fetchone()[0]
+
+
+    def load_last_date(self, columns=None):
+
+        last_date = self.get_last_date()
+
+        return self.load(columns=columns, dates=[] if last_date is None else [last_date])
+
+
+    def get_ids_from_date(self, date):
+        """ Get the ids stored for a given date """
+
+        with self.connect() as connection:
+            if not self.get_columns(connection):
+                return []
+
+            return [row[0] for row in connection.execute(f'SELECT id FROM "{self.table}" WHERE date = ?', (date,))]
+
+
+    def has_id_in_date(self, id, date):
+        """ Check if an id is stored for a given date """
+
+        with self.connect() as connection:
+            if not self.get_columns(connection):
+                return False
+
+            query = f'SELECT 1 FROM "{self.table}" WHERE date = ? AND id = ? LIMIT 1'
+
+            return connection.execute(query, (date, id)).fetchone() is not None
+
+
+    def delete_id(self, id):
+        """ Delete all rows of an id """
+
+        with self.connect() as connection:
+            connection.execute(f'DELETE FROM "{self.table}" WHERE id = ?', (id,))
+
+
+    def add_column(self, column):
+
+        with self.connect() as connection:
+            connection.execute(f'ALTER TABLE "{self.table}" ADD COLUMN "{column}" {self.get_column_type(column)}')
+
+
+    def drop_column(self, column):
+
+        with self.connect() as connection:
+            connection.execute(f'ALTER TABLE "{self.table}" DROP COLUMN "{column}"')
+
+
+    def backup(self, backup_path):
+        """ Copy the database to a given path """
+
+        source = sqlite3.connect(self.path, timeout=30)
+        target = sqlite3.connect(backup_path)
+
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
+
+def open_price_storage(path, index=None):
+    """ Choose a backend from the path of a table: csv file, sqlite database or parquet directory """
+
+    if path.endswith('.csv'):
+        return CSVStorage(path, index)
+
+    if path.endswith(('.sqlite', '.db')):
+        return SQLiteStorage(path, index)
+
+    if index and 'date' not in index:
+        raise ValueError(f'parquet storage is partitioned by date, cannot store {path}')
+
+    return ParquetStorage(path, index)
@@ -0,0 +1,131 @@
+""" A class that can be used to extract all fields of an amazon product page in one pass """
+
+import lxml.html
+
+from lxml import etree
+
+from marketplace import default_marketplace
+from tools import get_id_from_url
+
+
+"""
+Fields of the product page as (tag, attribute, value).
+They are compiled into one lookup table, so the tree is traversed only once
+"""
+selectors = {
+    'product_price': ('span', 'class', 'a-size-medium a-color-price offer-price a-text-normal'),
+    'kindle_page_price': ('span', 'id', 'kindle-price'),
+    'product_seller_infos': ('div', 'id', 'merchant-info'),
+    'author': ('a', 'class', 'a-link-normal contributorNameID'),
+    'title': ('span', 'id', 'productTitle'),
+    'subtitle': ('span', 'id', 'productSubtitle'),
+    'formats_prompt': ('span', 'id', 'showMoreFormatsPrompt'),
+    'format_name': ('span', 'class', 'a-size-small a-color-base'),
+    'format_price': ('span', 'class', 'a-size-small a-color-price'),
+}
+
+
+# text without scripts and styles, like get_text() in BeautifulSoup
+find_text = etree.XPath('.//text()[not(parent::script or parent::style)]')
+
+
+def get_text(element):
+    """ Get the stripped text of an element """
+
+    return ''.join(text.strip() for text in find_text(element))
+
+
+class ProductPageExtractor():
+    """ A class representing an extraction engine for amazon product pages """
+
+    def __init__(self, marketplace=None):
+
+        # texts and price format of the storefront the pages come from
+        self.marketplace = marketplace or default_marketplace
+
+        # (tag, attribute, value) -> field name
+        self.fields_by_selector = {selector: field for field, selector in selectors.items()}
+
+        # only these elements are visited; the iteration over them runs in libxml2
+        self.tags = tuple({tag for tag, attribute, value in selectors.values()})
+
+
+    def parse(self, html):
+        """ Parse a product page into an lxml tree """
+
+        try:
+            return lxml.html.document_fromstring(html)
+        except (etree.ParserError, ValueError):
+            return None
+
+
+    def get_field(self, element):
+        """ Get the field name for a matched element """
+
+        for attribute in ('id', 'class'):
+            field = self.fields_by_selector.get((element.tag, attribute, element.get(attribute)))
+
+            if field:
+                return field
+
+
+    def extract(self, html):
+        """ Extract all fields from a product page """
+
+        result = {
+            'product_price': None,
+            'kindle_page_price': None,
+            'product_seller_infos': None,
+            'author': None,
+            'title': None,
+            'subtitle': None,
+            'kindle_edition': None,
+            'kindle_price': None,
+        }
+
+        tree = self.parse(html) if isinstance(html, (str, bytes)) else html
+
+        if tree is None:
+            return result
+
+        return self.extract_from_tree(tree, result)
+
+
+    def extract_from_tree(self, tree, result):
+        """ Walk the matched elements once, in document order """
+
+        formats_prompt_found = False
+        kindle = None
+
+        for element in tree.iter(*self.tags):
+            field = self.get_field(element)
+
+            if not field:
+                continue
+
+            if field == 'formats_prompt':
+                formats_prompt_found = True
+
+            elif field == 'format_name':
+                # first Kindle entry after the formats prompt
+                if formats_prompt_found and kindle is None and get_text(element) == self.marketplace.kindle_format:
+                    kindle = element
+                    parent = element.getparent()
+                    href = parent.get('href') if parent is not None else None
+
+                    if href:
+                        result['kindle_edition'] = get_id_from_url(href)
+
+            elif field == 'format_price':
+                # first price after the 'Kindle' entry
+                if kindle is not None and result['kindle_price'] is None:
+                    result['kindle_price'] = self.marketplace.get_price_from_text(get_text(element))
+
+            elif field in ('product_price', 'kindle_page_price'):
+                if result[field] is None:
+                    result[field] = self.marketplace.get_price_from_text(get_text(element))
+
+            elif result[field] is None:
+                result[field] = get_text(element)
+
+        return result
@@ -0,0 +1,85 @@
+""" A class that can be used to limit the request rate per host """
+
+import asyncio
+import threading
+import time
+
+from urllib.parse import urlsplit
+
+
+class TokenBucket():
+    """ A class representing a token bucket for a single host """
+
+    def __init__(self, rate, capacity=1):
+
+        # tokens added per second and maximum number of stored tokens (burst)
+        self.rate = rate
+        self.capacity = capacity
+
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+        self.lock = threading.Lock()
+
+
+    def reserve(self):
+        """ Take a token and return the seconds to wait until it is available """
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            # tokens can go below zero: every waiting caller gets its own slot in the future
+            self.tokens -= 1
+
+            if self.tokens >= 0:
+                return 0
+
+            return -self.tokens / self.rate
+
+
+class RateLimiter():
+    """ A class representing a token bucket rate limiter per host """
+
+    def __init__(self, requests_per_second, burst=1, host_rates=None):
+
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+
+        # optional rate per host, e.g. {'www.goodreads.com': 1}
+        self.host_rates = host_rates or {}
+
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+
+    def get_bucket(self, url):
+        """ Get the token bucket for the host of a given url """
+
+        host = urlsplit(url).netloc or url
+
+        with self.lock:
+            if host not in self.buckets:
+                rate = self.host_rates.get(host, self.requests_per_second)
+                self.buckets[host] = TokenBucket(rate, self.burst)
+
+            return self.buckets[host]
+
+
+    def acquire(self, url):
+        """ Block until a request to the host of a given url is allowed """
+
+        waiting_time = self.get_bucket(url).reserve()
+
+        if waiting_time:
+            time.sleep(waiting_time)
+
+
+    async def acquire_async(self, url):
+        """ Wait without blocking the event loop until a request to the host of a given url is allowed """
+
+        waiting_time = self.get_bucket(url).reserve()
+
+        if waiting_time:
+            await asyncio.sleep(waiting_time)
@@ -0,0 +1,158 @@
+""" A class that can be used to render the deals report as html tables from a template """
+
+import html
+
+import numpy as np
+import pandas as pd
+
+from string import Template
+
+from marketplace import default_marketplace
+
+
+# column of the price table -> header in the report
+report_columns = {
+    'title': 'Title',
+    'format': 'Format',
+    'price': 'Price',
+    'average_price': 'Ø',
+    'diff_avg_price': 'Ø diff',
+    'average_price_last_week': 'Ø 7',
+    'diff_avg_price_last_week': 'Ø diff 7',
+    'lowest_price': 'Lowest',
+    'used_price': 'Used',
+    'kindle_price': 'Kindle',
+}
+
+report_style = '''<style>
+table.deals th {background-color: yellow; text-align: right; width: 80px}
+table.deals td {text-align: right; width: 80px}
+table.deals td.text {text-align: left}
+table.deals td.title {text-align: left; width: 700px}
+table.deals td.lowest {background-color: lightgreen}
+</style>
+'''
+
+table_template = Template('''<b>$title</b>
+<table class="table table-sm  align-middle deals">
+<thead>
+<tr>$header</tr>
+</thead>
+<tbody>
+''')
+
+table_end = '''</tbody>
+</table>
+'''
+
+# written at the position of the report content in the html page
+content_marker = '<!-- report content -->'
+
+default_page = f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n</head>\n<body>\n{content_marker}\n</body>\n</html>\n'
+
+
+def format_cents(values):
+    """ Format integer cents as euros with two decimals, empty if missing """
+
+    values = pd.Series(values).astype('Int64')
+    missing = values.isna().to_numpy()
+    cents = values.fillna(0).to_numpy(dtype='int64')
+
+    absolute = np.abs(cents)
+    sign = np.where(cents < 0, '-', '')
+    euros = (absolute // 100).astype(str)
+    decimals = np.char.zfill((absolute % 100).astype(str), 2)
+
+    formatted = np.char.add(np.char.add(np.char.add(sign, euros), '.'), decimals)
+
+    return np.where(missing, '', formatted).astype(object)
+
+
+def format_text(values):
+    """ Escape text for html, categoricals are escaped once per category """
+
+    return pd.Series(values).astype(object).map(html.escape, na_action='ignore').fillna('').to_numpy(dtype=object)
+
+
+class ReportRenderer():
+    """ A class representing a renderer that streams report tables into an html page """
+
+    def __init__(self, marketplace=None, chunk_size=1000):
+
+        # product pages of the marketplace of the report, the id is appended
+        self.url = (marketplace or default_marketplace).get_product_url('')
+
+        # rows formatted and written per step, the report is never held in memory as one string
+        self.chunk_size = chunk_size
+
+        self.header = ''.join(f'<th>{header}</th>' for header in report_columns.values())
+
+
+    def format_cells(self, df, highlight_lowest=True):
+        """ Format all cells of a table column by column, returns a list of arrays of <td> strings """
+
+        ids = df.index.get_level_values('id').astype(str).to_numpy(dtype=object)
+        titles = format_text(df['title'])
+
+        links = '<a href="' + self.url + ids + '">' + titles + '</a><code style="display:block">' + ids + '</code>'
+
+        price = df['price'].astype('Int64')
+        lowest_price = df['lowest_price'].astype('Int64')
+
+        # the current price is the lowest price seen so far
+        lowest = (price <= lowest_price).fillna(False).to_numpy(dtype=bool) & highlight_lowest
+        lowest_class = np.where(lowest, ' class="lowest"', '').astype(object)
+
+        cells = []
+
+        for column in report_columns:
+            if column == 'title':
+                cells.append('<td class="title">' + links + '</td>')
+
+            elif column == 'format':
+                cells.append('<td class="text">' + format_text(df[column]) + '</td>')
+
+            elif column in ('price', 'lowest_price'):
+                cells.append('<td' + lowest_class + '>' + format_cents(df[column]) + '</td>')
+
+            else:
+                cells.append('<td>' + format_cents(df[column]) + '</td>')
+
+        return cells
+
+
+    def format_rows(self, df, highlight_lowest=True):
+        """ Join the cells of each row """
+
+        if not len(df):
+            return ''
+
+        rows = '<tr>' + np.sum(self.format_cells(df, highlight_lowest), axis=0) + '</tr>\n'
+
+        return ''.join(rows)
+
+
+    def write_table(self, f, report, df):
+        """ Write a table in chunks of rows """
+
+        f.write(table_template.substitute(title=html.escape(report['title']), header=self.header))
+
+        for start in range(0, len(df), self.chunk_size):
+            f.write(self.format_rows(df.iloc[start : start + self.chunk_size], report.get('highlight_lowest', True)))
+
+        f.write(table_end)
+
+
+    def write(self, path, reports, page=None):
+        """ Write (report, DataFrame) pairs of DealRules.get_reports into a page containing the content marker """
+
+        head, tail = (page or default_page).split(content_marker, 1)
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(head)
+            f.write(report_style)
+
+            for report, df in reports:
+                self.write_table(f, report, df)
+
+            f.write(tail)
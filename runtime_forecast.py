@@ -0,0 +1,190 @@
+""" A class that can be used to forecast the runtime of a crawl from past runs and to choose its pacing """
+
+import json
+import math
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+class CrawlHistory():
+    """ A class representing the request latencies and error rates of past crawl runs, persisted as json """
+
+    def __init__(self, history_path, max_runs=30):
+
+        self.history_path = history_path
+
+        # oldest runs are dropped, the forecast follows the current behaviour of the host
+        self.max_runs = max_runs
+
+        self.runs = self.load()
+
+
+    def load(self):
+
+        if not os.path.exists(self.history_path):
+            return []
+
+        try:
+            with open(self.history_path, encoding='utf-8') as f:
+                return json.load(f)['runs']
+        except (json.JSONDecodeError, KeyError):
+            print(f'ignoring unreadable crawl history: {self.history_path}')
+            return []
+
+
+    def save(self):
+
+        # a unique name per call, the workers of a lease queue save the same file
+        file_descriptor, temporary_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(self.history_path) or '.')
+
+        with os.fdopen(file_descriptor, 'w', encoding='utf-8') as f:
+            json.dump({'runs': self.runs}, f, indent=2)
+
+        os.replace(temporary_path, self.history_path)
+
+
+    def record(self, metrics, host, date, runtime, ids, crawl_mode):
+        """ Add the requests to a host recorded in the metrics of a finished run """
+
+        statuses, latencies = metrics.get_host_requests(host)
+        requests = sum(statuses.values())
+
+        if not requests:
+            return None
+
+        # connection errors, throttling (503) and missing pages all cost a request without a row
+        errors = requests - statuses.get('200', 0)
+
+        self.runs.append({
+            'date': date,
+            'finished_at': time.time(),
+            'crawl_mode': crawl_mode,
+            'ids': ids,
+            'requests': requests,
+            'errors': errors,
+            'latency_mean': float(np.mean(latencies)) if latencies else None,
+            'latency_p90': float(np.quantile(latencies, 0.9)) if latencies else None,
+            'runtime': runtime,
+        })
+
+        self.runs = self.runs[-self.max_runs:]
+        self.save()
+
+
+class RuntimeForecast():
+    """ A class representing a runtime forecast and a pacing plan that fits a time window and a request budget """
+
+    def __init__(self, crawl_history, time_window=8 * 60 * 60, request_budget=None, default_latency=2, recent_runs=7):
+
+        self.crawl_history = crawl_history
+
+        # seconds a run may take and maximum number of requests per run (None: no limit)
+        self.time_window = time_window
+        self.request_budget = request_budget
+
+        # seconds per request until the history has a run
+        self.default_latency = default_latency
+
+        # number of past runs the latency and error rate are taken from
+        self.recent_runs = recent_runs
+
+
+    def get_recent_runs(self):
+
+        return [run for run in self.crawl_history.runs[-self.recent_runs:] if run['requests']]
+
+
+    def get_latency(self):
+        """ Get the mean seconds per request of the recent runs, weighted by their requests """
+
+        runs = [run for run in self.get_recent_runs() if run['latency_mean'] is not None]
+
+        if not runs:
+            return self.default_latency
+
+        return sum(run['latency_mean'] * run['requests'] for run in runs) / sum(run['requests'] for run in runs)
+
+
+    def get_error_rate(self):
+        """ Get the share of requests of the recent runs that did not return a product page """
+
+        runs = self.get_recent_runs()
+
+        if not runs:
+            return 0
+
+        return sum(run['errors'] for run in runs) / sum(run['requests'] for run in runs)
+
+
+    def get_requests(self, number_of_ids):
+        """ Get the expected requests for a number of ids, failed ids are requested again by a later attempt """
+
+        # capped, a run with mostly errors would otherwise ask for an unbounded number of retries
+        error_rate = min(self.get_error_rate(), 0.5)
+
+        return math.ceil(number_of_ids / (1 - error_rate))
+
+
+    def forecast(self, number_of_ids, crawl_mode, requests_per_second, concurrency, waiting_time_between_ids=0,
+                 number_of_buckets=0, waiting_time_between_buckets=0):
+        """ Get the expected seconds to crawl a number of ids with given settings """
+
+        requests = self.get_requests(number_of_ids)
+        latency = self.get_latency()
+
+        if crawl_mode == 'serial':
+            # one request after the other, each followed by the waiting time
+            return requests * (latency + waiting_time_between_ids) + number_of_buckets * waiting_time_between_buckets
+
+        # the slower of the rate limit and the concurrent requests in flight
+        return requests / min(requests_per_second, concurrency / latency)
+
+
+    def plan(self, number_of_ids, crawl_mode, requests_per_second, concurrency, waiting_time_between_buckets=0,
+             bucket_size=None, flush_interval=600):
+        """ Get the pacing for a number of ids: the given request rate unless the latency is slower,
+        and only the first ids if the crawl would go over the time window or the request budget """
+
+        latency = self.get_latency()
+        requests = self.get_requests(number_of_ids)
+        error_rate = self.get_error_rate()
+
+        # the configured rate is never exceeded, a slow host lowers it
+        if crawl_mode == 'serial':
+            requests_per_second = min(requests_per_second, 1 / latency)
+        else:
+            requests_per_second = min(requests_per_second, concurrency / latency)
+
+        # without a given size a flush about every flush interval, a crash loses at most one bucket of pages
+        if bucket_size is None:
+            bucket_size = max(1, round(flush_interval * requests_per_second))
+
+        # the waiting time after each bucket is spread over its requests
+        seconds_per_request = 1 / requests_per_second + waiting_time_between_buckets / bucket_size
+
+        max_requests = int(self.time_window / seconds_per_request)
+
+        if self.request_budget is not None:
+            max_requests = min(max_requests, self.request_budget)
+
+        fits = requests <= max_requests
+
+        # over the window or the budget: only the first ids are crawled, in schedule order the most important ones
+        if not fits:
+            number_of_ids = int(max_requests * (1 - min(error_rate, 0.5)))
+            requests = self.get_requests(number_of_ids)
+
+        return {
+            'ids': number_of_ids,
+            'requests': requests,
+            'max_requests': max_requests,
+            'latency': latency,
+            'error_rate': error_rate,
+            'requests_per_second': requests_per_second,
+            'bucket_size': bucket_size,
+            'runtime': requests * seconds_per_request,
+            'fits': fits,
+        }
@@ -0,0 +1,132 @@
+""" Functions that can be used to apply the typed schema of the tables """
+
+import numpy as np
+import pandas as pd
+
+from pandas.api.types import is_integer_dtype
+
+
+# prices are stored as integer cents, csv files keep prices in euros
+price_columns = [
+    'target_price',
+    'price',
+    'used_price',
+    'average_price',
+    'average_price_last_week',
+    'lowest_price',
+    'kindle_price',
+    'diff_target_price',
+    'diff_avg_price',
+    'diff_avg_price_last_week',
+    ]
+
+# columns of a row of the price table, indexed by (date, id)
+book_prices_columns = [
+    'title',
+    'format',
+    'target_price',
+    'price',
+    'used_price',
+    'average_price',
+    'average_price_last_week',
+    'lowest_price',
+    'kindle_price',
+    ]
+
+# repeated on every date of the history, ids and dates are already factorized as MultiIndex levels
+category_columns = ['title', 'format']
+
+price_dtype = 'Int32'
+
+
+def to_cents(values):
+    """ Convert prices in euros (text or float) to integer cents """
+
+    return (pd.to_numeric(values, errors='coerce') * 100).round().astype(price_dtype)
+
+
+def to_euros(values):
+    """ Convert integer cents to float euros, NaN if missing """
+
+    return values.astype('float64') / 100
+
+
+def price_to_cents(price):
+    """ Convert a single price in euros to integer cents, None if missing """
+
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        return None
+
+    if np.isnan(price):
+        return None
+
+    return int(round(price * 100))
+
+
+def apply_schema(df, prices_in_cents=False, categories=True):
+    """ Cast known columns: prices to integer cents, repeated text to categoricals """
+
+    df = df.copy()
+
+    for column in price_columns:
+        if column not in df.columns:
+            continue
+
+        if prices_in_cents or is_integer_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], errors='coerce').round().astype(price_dtype)
+        else:
+            df[column] = to_cents(df[column])
+
+    if categories:
+        for column in category_columns:
+            if column in df.columns:
+                df[column] = df[column].astype('category')
+
+    return df
+
+
+def to_text(df):
+    """ Convert a typed DataFrame back to the csv format: prices in euros """
+
+    df = df.copy()
+
+    for column in price_columns:
+        if column in df.columns and is_integer_dtype(df[column]):
+            df[column] = to_euros(df[column])
+
+    return df
+
+
+def remove_categories(df):
+    """ Convert categoricals to plain values, e.g. for storage backends with a fixed column type """
+
+    df = df.copy()
+
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(object)
+
+    return df
+
+
+def concat_rows(df, new_rows):
+    """ Concatenate new rows without losing the categoricals of the history """
+
+    new_rows = new_rows.copy()
+
+    for column in category_columns:
+        if column not in df.columns or not isinstance(df[column].dtype, pd.CategoricalDtype):
+            continue
+
+        # extend the categories instead of falling back to object columns
+        categories = df[column].cat.categories
+        new_categories = pd.Index(new_rows[column].dropna().unique()).difference(categories)
+
+        if len(new_categories):
+            df[column] = df[column].cat.add_categories(new_categories)
+
+        new_rows[column] = pd.Categorical(new_rows[column], categories=df[column].cat.categories)
+
+    return pd.concat([df, new_rows])
@@ -0,0 +1,32 @@
+""" Tests of the price storage backends """
+
+import pandas as pd
+
+from price_storage import ParquetStorage
+from schema import apply_schema
+
+
+def create_rows(date, price):
+
+    df = pd.DataFrame({'date': [date], 'id': ['3257071015'], 'title': ['Stiller'], 'price': [price]})
+
+    return df.set_index(['date', 'id'])
+
+
+def test_parquet_append_to_dataset_with_prices_as_text(tmp_path):
+
+    storage = ParquetStorage(str(tmp_path / 'book_prices'))
+
+    # a partition written before the typed schema: prices as text in euros
+    create_rows('2024-01-01', '39.99').reset_index().to_parquet(storage.path, partition_cols=['date'], index=False)
+
+    storage.append(apply_schema(create_rows('2024-01-02', 4003), prices_in_cents=True))
+
+    assert storage.load()['price'].tolist() == [3999, 4003]
+    assert storage.load_last_date()['price'].tolist() == [4003]
+
+    storage.upgrade()
+    storage.append(apply_schema(create_rows('2024-01-03', 4100), prices_in_cents=True))
+
+    assert storage.prices_in_cents()
+    assert storage.load()['price'].tolist() == [3999, 4003, 4100]